@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Blog Fragments
+
+Cached template fragments built from blog content (see caching/registry.py).
+"""
+from wagtail.core.models import Page
+from wagtail.images import get_image_model
+
+from caching.registry import Dependency, RENDITION_FIELDS, fragments
+
+from .models import (
+    BlogAuthor, BlogAuthorsOrderable, BlogCategory, BlogDetailPage
+)
+
+
+def previews(posts):
+    """Vary-on lists for the preview card of every post in ``posts``."""
+    return [[pk] for pk in posts.values_list('pk', flat=True)]
+
+
+# blog_listing_page.html: {% cache 604800 blog_post_preview post.id %}
+fragments.register(
+    'blog_post_preview',
+    Dependency(BlogDetailPage, vary_on=lambda post: [[post.pk]]),
+    # Moving a post, or any page above it, changes the post's URL.
+    Dependency(
+        Page, fields=['url_path'],
+        vary_on=lambda page: previews(
+            BlogDetailPage.objects.filter(path__startswith=page.path)
+        )
+    ),
+    Dependency(BlogAuthorsOrderable, vary_on=lambda link: [[link.page_id]]),
+    Dependency(
+        BlogAuthor, fields=['first_name', 'last_name', 'website', 'image'],
+        vary_on=lambda author: previews(
+            BlogDetailPage.objects.filter(blog_authors__author=author)
+        )
+    ),
+    Dependency(
+        BlogCategory, fields=['name', 'slug'],
+        vary_on=lambda category: previews(
+            BlogDetailPage.objects.filter(categories=category)
+        )
+    ),
+    Dependency(
+        get_image_model(), fields=RENDITION_FIELDS,
+        vary_on=lambda image: previews(
+            BlogDetailPage.objects.filter(blog_image=image)
+        )
+    ),
+)
@@ -5,12 +5,12 @@ Blog Listing and Detail Page Definitions.
 This models.py file defines the data models for our Blog app.
 """
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Prefetch
 from django.shortcuts import render
 from django.utils.text import slugify
 from django import forms
-from django.core.cache import cache
-from django.core.cache.utils import make_template_fragment_key
 from django.core.paginator import (
     EmptyPage, PageNotAnInteger, Paginator
 )
@@ -30,7 +30,13 @@ from wagtail.contrib.routable_page.models import RoutablePageMixin, route
 from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.snippets.models import register_snippet
 
+from learnwt.api_prefetch import prefetch_parental_m2m
+from learnwt.pagination import CursorPaginator
+from renditions.prefetch import get_rendition, prefetch_renditions
+from renditions.specs import register_spec
 from streams import blocks
+from streams.references import resolve_references
+from streams.richtext import load_expansions, stored_rich_text
 from logging import getLogger
 
 
@@ -50,6 +56,12 @@ class BlogAuthorsOrderable(Orderable):
         APIField('author_name'),
         APIField('author_website')
     ]
+    # Relations the properties below read, loaded for all results at once
+    # by the API (learnwt/api_prefetch.py).
+    api_prefetch = {
+        'author_name': ['author'],
+        'author_website': ['author'],
+    }
     panels = [
         SnippetChooserPanel('author')
     ]
@@ -166,6 +178,11 @@ class BlogListingPage(RoutablePageMixin, Page):
     """Return list of all blog detail pages."""
 
     template = 'blog/blog_listing_page.html'
+    # Rendition used by the post cards in blog_listing_page.html and
+    # latest_posts.html.
+    listing_image_spec = register_spec('fill-400x200')
+    # Anonymous views are served from the page cache (caching/pages.py).
+    cache_for_anonymous = True
 
     custom_title = models.CharField(
         max_length=100, blank=False, null=False,
@@ -175,24 +192,68 @@ class BlogListingPage(RoutablePageMixin, Page):
     def get_context(self, request, *args, **kwargs):
         """Adding blog pages."""
         context = super().get_context(request, *args, **kwargs)
-        # This will contain plenty of subclassed results so you will need
-        # to use post.specific() to access properties of these posts.
-        all_posts = BlogDetailPage.objects.live().public().order_by('id')
-        # Adding custom pagination to handle errors explicitly
-        paginator = Paginator(all_posts, 3)
-        page = request.GET.get("page")
-
-        try:
-            posts = paginator.page(page)
-        except PageNotAnInteger:
-            posts = paginator.page(1)
-        except EmptyPage:
-            posts = paginator.page(paginator.num_pages)
-
+        all_posts = self.get_posts()
+        if settings.CURSOR_PAGINATION:
+            paginator = CursorPaginator(all_posts, 3, ordering=('id', ))
+            posts = paginator.page(request.GET.get("cursor"))
+        else:
+            # Adding custom pagination to handle errors explicitly
+            paginator = Paginator(all_posts, 3)
+            page = request.GET.get("page")
+
+            try:
+                posts = paginator.page(page)
+            except PageNotAnInteger:
+                posts = paginator.page(1)
+            except EmptyPage:
+                posts = paginator.page(paginator.num_pages)
+
+        self.hydrate_posts(posts, request)
         context['posts'] = posts
         context['categories'] = BlogCategory.objects.all()
         return context
 
+    def get_posts(self):
+        """
+        Return the live blog posts in listing order.
+
+        Everything a post card needs is loaded up front, so a page of posts
+        costs the same handful of queries whatever its size: the image is
+        joined in, the authors are prefetched and the StreamField content
+        (never shown here) is skipped. Categories, renditions and URLs are
+        attached per page of posts in hydrate_posts().
+        """
+        # This will contain plenty of subclassed results so you will need
+        # to use post.specific() to access properties of these posts.
+        return BlogDetailPage.objects.live().public().defer(
+            'content'
+        ).select_related(
+            'blog_image'
+        ).prefetch_related(
+            Prefetch(
+                'blog_authors',
+                queryset=BlogAuthorsOrderable.objects.select_related('author')
+            ),
+        ).order_by('id')
+
+    def hydrate_posts(self, posts, request):
+        """Attach categories, card image, summary and URL to each post on this page."""
+        # Categories in their Meta.ordering, by name.
+        prefetch_parental_m2m(posts, BlogDetailPage._meta.get_field('categories'))
+        prefetch_renditions(
+            [post.blog_image for post in posts], self.listing_image_spec
+        )
+        # The summary HTML stored at publish, see streams/richtext.py.
+        summaries = load_expansions([post.blog_summary for post in posts])
+        for post in posts:
+            post.listing_url = post.get_url(request)
+            post.listing_summary = stored_rich_text(post.blog_summary, summaries)
+            post.listing_image = None
+            if post.blog_image:
+                post.listing_image = get_rendition(
+                    post.blog_image, self.listing_image_spec
+                )
+
     api_fields = [
         APIField('custom_title'),
     ]
@@ -230,6 +291,9 @@ class BlogListingPage(RoutablePageMixin, Page):
 class BlogDetailPage(Page):
     """Define parental blog detail class."""
 
+    # Anonymous views are served from the page cache (caching/pages.py).
+    cache_for_anonymous = True
+
     custom_title = models.CharField(
         max_length=100, null=False, blank=False
     )
@@ -255,13 +319,25 @@ class BlogDetailPage(Page):
         ("cta", blocks.CTABlock()),
     ], null=True, blank=True)
 
+    # Boosts rank title (2, from Page) > custom_title > blog_summary > the rest.
     search_fields = Page.search_fields + [
-        index.SearchField('custom_title'),
-        index.SearchField('blog_summary'),
-        index.SearchField('blog_image'),
+        index.SearchField('custom_title', boost=1.5),
+        index.SearchField('blog_summary', boost=1.2),
         index.SearchField('content'),
-        index.SearchField('blog_authors'),
-        index.SearchField('categories')
+        # Reindexed when an author, category or image is renamed, see
+        # search/signals.py.
+        index.RelatedFields('blog_image', [
+            index.SearchField('title'),
+        ]),
+        index.RelatedFields('blog_authors', [
+            index.RelatedFields('author', [
+                index.SearchField('first_name'),
+                index.SearchField('last_name'),
+            ]),
+        ]),
+        index.RelatedFields('categories', [
+            index.SearchField('name'),
+        ]),
     ]
     content_panels = Page.content_panels + [
         FieldPanel('custom_title'),
@@ -286,19 +362,24 @@ class BlogDetailPage(Page):
         APIField('categories')
     ]
 
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        # Load every page the blocks link to in one go.
+        resolve_references(self.content, request)
+        return context
+
+    def author_cards(self):
+        """Authors with their card images (components/author_card.html)."""
+        authors = list(self.blog_authors.select_related('author__image'))
+        prefetch_renditions(
+            [orderable.author.image for orderable in authors], 'fill-50x50'
+        )
+        return authors
+
     class Meta:
         verbose_name = 'Blog Detail'
         verbose_name_plural = 'Blog Details'
 
-    def save(self, *args, **kwargs):
-        """Clear the cache for this specific BlogDetail object on save."""
-        cache_key = make_template_fragment_key(
-            'blog_post_preview',
-            [self.id, ]
-        )
-        logger.info(f'BlogDetail page saved. Deleting cache {cache_key}')
-        cache.delete(cache_key)
-        return super().save(*args, **kwargs)
 
 # First sub-classed blog detail page
 class ArticleBlogPage(BlogDetailPage):
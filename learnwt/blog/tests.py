@@ -1,3 +1,71 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from learnwt.testing import create_image, create_post, create_site, test_settings
+from menus.models import Menu
+
+from .models import BlogAuthor, BlogCategory
+
+
+@test_settings
+class BlogListingTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        # The side nav shows it.
+        Menu.objects.create(title='Main Menu', slug='main-menu')
+        self.categories = [BlogCategory.objects.create(name=f'Category {i}') for i in range(2)]
+        self.authors = [
+            BlogAuthor.objects.create(first_name='Author', last_name=str(i)) for i in range(2)
+        ]
+        self.posts = [
+            create_post(
+                self.site.listing, i, self.site.image, self.categories[:1], self.authors[:1]
+            )
+            for i in range(4)
+        ]
+
+    def get_listing(self, query=''):
+        # Render it, not the page cache or the cached post cards.
+        cache.clear()
+        return self.client.get('/blog/' + query)
+
+    def count_queries(self):
+        self.get_listing()  # Generates the renditions.
+        with CaptureQueriesContext(connection) as queries:
+            self.get_listing()
+        return len(queries)
+
+    def test_listing_shows_posts(self):
+        response = self.get_listing()
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Post 0')
+        self.assertContains(response, 'Summary of post 0')
+        self.assertContains(response, 'fill-400x200')
+        self.assertNotContains(response, 'Post 3')
+
+    def test_queries_dont_depend_on_what_posts_show(self):
+        queries = self.count_queries()
+        for number, post in enumerate(self.posts):
+            post.blog_image = create_image(f'Image {number}')
+            post.categories = self.categories
+            post.blog_authors.create(author=self.authors[1])
+            post.save_revision().publish()
+        self.get_listing()
+        cache.clear()
+        with self.assertNumQueries(queries):
+            self.get_listing()
+
+    def test_post_categories_are_attached(self):
+        post = self.posts[0]
+        post.categories = self.categories
+        post.save_revision().publish()
+        posts = list(self.site.listing.get_posts()[:3])
+        self.site.listing.hydrate_posts(posts, None)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [category.name for category in posts[0].categories.all()],
+                ['Category 0', 'Category 1']
+            )
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+API Response Cache
+
+Clients poll the /api/v2/ endpoints for content that only changes when an
+editor publishes, and every poll serialised whole pages again (StreamField,
+authors, carousel images). GET responses are instead stored as their body
+plus a strong ETag (a hash of the body) and a Last-Modified date, keyed on
+site, path, query string and Accept header. Conditional requests are then
+answered from the cache, with a 304 where the client's copy is current and
+without serialising anything either way.
+
+Each entry remembers the tokens read before it was serialised and is a miss
+once one of them has changed:
+
+* the page cache generation (caching/pages.py), for menus, settings and
+  page moves;
+* the API pages generation, replaced when a page is published, unpublished
+  or deleted;
+* the API content generation, replaced when other content the API shows
+  (images, documents, collections, snippets, sites) changes. It carries the
+  time of that change, which bounds the Last-Modified of page details.
+
+Any publish drops every response, so the pages endpoint can also keep what
+it serialised for each page, keyed on the page's live revision rather than
+the pages generation (``settings.API_CACHE_REPRESENTATIONS``). A response
+rebuilt after a publish then only serialises the pages that changed, see
+cached_representations().
+
+Responses that aren't final yet, like ones linking to renditions still being
+generated, call skip_response() to stay out of both.
+"""
+import hashlib
+import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, urlencode
+
+from . import pages
+
+
+PAGES_KEY = 'api_cache:pages'
+CONTENT_KEY = 'api_cache:content'
+
+
+def response_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    site_id = request.site.pk if getattr(request, 'site', None) else None
+    location = (
+        f'{site_id}:{request.path}?{query}:{request.META.get("HTTP_ACCEPT", "")}'
+    )
+    return 'api_cache:response:' + hashlib.md5(location.encode()).hexdigest()
+
+
+def is_cacheable_request(request):
+    return request.method in ('GET', 'HEAD')
+
+
+def skip_response(request):
+    """Keep what's serialised for this request out of the API cache."""
+    getattr(request, '_request', request).api_cache_skip = True
+
+
+def is_skipped(request):
+    return getattr(request, 'api_cache_skip', False)
+
+
+def get_tokens():
+    """Return the current tokens, starting any that were never set/evicted."""
+    keys = [pages.GENERATION_KEY, PAGES_KEY, CONTENT_KEY]
+    tokens = cache.get_many(keys)
+    if len(tokens) < len(keys):
+        cache.add(pages.GENERATION_KEY, uuid4().hex, None)
+        cache.add(PAGES_KEY, uuid4().hex, None)
+        cache.add(CONTENT_KEY, (uuid4().hex, time.time()), None)
+        tokens = cache.get_many(keys)
+    return tuple(tokens.get(key) for key in keys)
+
+
+def content_changed_at(tokens):
+    """When the API content generation in ``tokens`` started."""
+    return tokens[2][1]
+
+
+def get_entry(request):
+    """Return the cached entry for this request or None."""
+    entry = cache.get(response_key(request))
+    if entry is None:
+        return None
+    tokens, *rest = entry
+    if tokens != get_tokens():
+        return None
+    return rest
+
+
+def store_entry(request, tokens, response, last_modified):
+    """Cache a rendered 200 response, returns the entry to respond with."""
+    content = response.content
+    entry = [
+        content,
+        response['Content-Type'],
+        '"' + hashlib.md5(content).hexdigest() + '"',
+        int(last_modified),
+    ]
+    cache.set(response_key(request), [tokens] + entry, settings.API_CACHE_TIMEOUT)
+    return entry
+
+
+def respond(request, entry):
+    """Return the entry's response, or a 304 if the client has it."""
+    content, content_type, etag, last_modified = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    response['Vary'] = 'Accept'
+    response['Last-Modified'] = http_date(last_modified)
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response
+    )
+
+
+def cached_representations(request, pages, signature, serialize):
+    """
+    Return the representation of each page, calling ``serialize(pages)`` for
+    those not cached at the page's live revision.
+
+    ``signature`` tells apart the representations of a page: the model it's
+    serialised as, the view and the fields asked for.
+    """
+    generation, _, content = get_tokens()
+    prefix = f'{generation}:{content[0]}:{request.get_host()}:{signature}'
+    keys = {
+        page.pk: 'api_cache:representation:' + hashlib.md5(
+            f'{prefix}:{page.pk}:{page.live_revision_id}'.encode()
+        ).hexdigest()
+        for page in pages
+        # Pages published without a revision can't be told apart.
+        if page.live_revision_id is not None
+    }
+    cached = cache.get_many(keys.values())
+    missing = [page for page in pages if keys.get(page.pk) not in cached]
+    fresh = dict(zip((page.pk for page in missing), serialize(missing)))
+    if not is_skipped(request):
+        cache.set_many(
+            {keys[pk]: data for pk, data in fresh.items() if pk in keys},
+            settings.API_CACHE_TIMEOUT
+        )
+    return [
+        fresh[page.pk] if page.pk in fresh else cached[keys[page.pk]]
+        for page in pages
+    ]
+
+
+def purge_pages():
+    """Invalidate every cached response, after a page was (un)published."""
+    transaction.on_commit(lambda: cache.set(PAGES_KEY, uuid4().hex, None))
+
+
+def purge_content():
+    """Invalidate every cached response, after other content changed."""
+    transaction.on_commit(
+        lambda: cache.set(CONTENT_KEY, (uuid4().hex, time.time()), None)
+    )
+
+
+class CachedEndpointMixin:
+    """
+    Serve an API endpoint from the API response cache.
+
+    ``get_last_modified()`` returns the Last-Modified of a response about to
+    be cached; by default that's when the API content last changed, so an
+    evicted response comes back with the date it had.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return super().dispatch(request, *args, **kwargs)
+        entry = get_entry(request)
+        if entry is None:
+            # Read before serialising, so a change made meanwhile is a miss.
+            tokens = get_tokens()
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming or is_skipped(request):
+                return response
+            response.render()
+            entry = store_entry(
+                request, tokens, response,
+                self.get_last_modified(tokens, *args, **kwargs)
+            )
+        return respond(request, entry)
+
+    def get_last_modified(self, tokens, *args, **kwargs):
+        return content_changed_at(tokens)
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class CachingConfig(AppConfig):
+    name = 'caching'
+
+    def ready(self):
+        # Every app declares its cached template fragments in fragments.py,
+        # the same way wagtail_hooks.py modules are picked up.
+        autodiscover_modules('fragments')
+        from . import signals
+        signals.connect_tracked_models()
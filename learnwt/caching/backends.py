@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Two-Tier Cache Backend
+
+A bounded, size-aware, in-process LRU (L1) in front of any shared Django cache
+backend (L2). Templates read the same few fragments and tokens thousands of
+times a minute; L1 answers those without touching the file system or network.
+
+Writes go to L2 and are broadcast to the other worker processes through a
+local SQLite file, so they drop their L1 copy. Each worker reads the channel
+at most every POLL_INTERVAL seconds, which bounds how stale an L1 entry can be.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'caching.backends.TwoTierCache',
+            'LOCATION': 'default',
+            'OPTIONS': {
+                'SHARED_CACHE': 'shared',
+                'CHANNEL': os.path.join(BASE_DIR, 'cache', 'invalidations.sqlite3'),
+            },
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        },
+    }
+
+OPTIONS:
+
+* SHARED_CACHE - alias of the L2 cache (required).
+* MAX_SIZE - L1 budget in bytes of pickled values (default 16MB).
+* MAX_ENTRY_SIZE - larger values skip L1 (default MAX_SIZE / 16).
+* L1_TIMEOUT - longest an entry stays in L1 (default 300 seconds).
+* NEGATIVE_TIMEOUT - how long an L2 miss is remembered (default 5 seconds).
+* CHANNEL - path of the SQLite invalidation channel; without it L1 is only
+  safe for a single process.
+* POLL_INTERVAL - seconds between channel reads (default 0.5).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+# Stand-in for a missing key in L1, so repeated misses don't reach L2.
+MISSING = object()
+
+# Process-wide L1 stores keyed by LOCATION. Django creates one backend
+# instance per thread, but all threads of a worker should share one L1.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LRUStore:
+    """Thread-safe, size-bounded LRU of pickled values with expiry times."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        self.stats = dict.fromkeys([
+            'hits', 'negative_hits', 'misses', 'evictions', 'invalidations',
+        ], 0)
+
+    def get(self, key):
+        """Return the value, MISSING for a remembered miss, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            expires, pickled = entry
+            if expires is not None and expires <= time.time():
+                self._remove(key)
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            if pickled is MISSING:
+                self.stats['negative_hits'] += 1
+                return MISSING
+            self.stats['hits'] += 1
+        return pickle.loads(pickled)
+
+    def set(self, key, pickled, expires):
+        size = self._size(key, pickled)
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (expires, pickled)
+            self.size += size
+            while self.size > self.max_size and self.entries:
+                oldest = next(iter(self.entries))
+                self._remove(oldest)
+                self.stats['evictions'] += 1
+
+    def delete(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= self._size(key, entry[1])
+
+    @staticmethod
+    def _size(key, pickled):
+        return len(key) + (0 if pickled is MISSING else len(pickled))
+
+
+class SQLiteChannel:
+    """
+    Broadcast invalidated keys between worker processes through SQLite.
+
+    Messages older than RETENTION seconds are pruned; a worker that has been
+    idle for longer than that can't know what it missed and clears its L1.
+    """
+
+    RETENTION = 300
+    CLEAR_ALL = '*'
+
+    def __init__(self, path):
+        self.path = path
+        self.origin = None
+        self.local = threading.local()
+        self.last_seen = None
+
+    @property
+    def connection(self):
+        # One connection per thread, reopened in forked workers.
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS invalidations ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT, '
+                'cache_key TEXT, created REAL)'
+            )
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        if self.origin is None or self.origin[0] != os.getpid():
+            # A forked worker keeps its parent's L1 and so its last_seen too.
+            self.origin = (os.getpid(), uuid4().hex)
+        return connection
+
+    def listen(self):
+        """Start from the latest message, before anything goes into L1."""
+        row = self.connection.execute('SELECT MAX(id) FROM invalidations').fetchone()
+        self.last_seen = row[0] or 0
+
+    def publish(self, keys):
+        connection = self.connection
+        now = time.time()
+        connection.executemany(
+            'INSERT INTO invalidations (origin, cache_key, created) VALUES (?, ?, ?)',
+            [(self.origin[1], key, now) for key in keys]
+        )
+        connection.execute(
+            'DELETE FROM invalidations WHERE created < ?', (now - self.RETENTION, )
+        )
+
+    def poll(self):
+        """Return keys other workers invalidated since the last poll."""
+        connection = self.connection
+        oldest = connection.execute('SELECT MIN(id) FROM invalidations').fetchone()[0]
+        rows = connection.execute(
+            'SELECT id, origin, cache_key FROM invalidations WHERE id > ? ORDER BY id',
+            (self.last_seen, )
+        ).fetchall()
+        missed = oldest is not None and oldest > self.last_seen + 1
+        if rows:
+            self.last_seen = rows[-1][0]
+        if missed:
+            return [self.CLEAR_ALL]
+        return [key for _, origin, key in rows if origin != self.origin[1]]
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED_CACHE']
+        max_size = options.get('MAX_SIZE', 16 * 1024 * 1024)
+        self.max_entry_size = options.get('MAX_ENTRY_SIZE', max_size // 16)
+        self.l1_timeout = options.get('L1_TIMEOUT', 300)
+        self.negative_timeout = options.get('NEGATIVE_TIMEOUT', 5)
+        self.poll_interval = options.get('POLL_INTERVAL', 0.5)
+
+        with _stores_lock:
+            if location not in _stores:
+                channel = options.get('CHANNEL')
+                if channel:
+                    channel = SQLiteChannel(channel)
+                    channel.listen()
+                _stores[location] = (LRUStore(max_size), channel or None, {'polled': 0})
+        self.l1, self.channel, self.poll_state = _stores[location]
+
+    @property
+    def l2(self):
+        return caches[self.shared_alias]
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size of this worker's L1."""
+        with self.l1.lock:
+            return dict(self.l1.stats, size=self.l1.size, entries=len(self.l1.entries))
+
+    # L1 helpers
+
+    def _sync(self):
+        """Drop the L1 entries other workers have invalidated."""
+        if self.channel is None:
+            return
+        now = time.time()
+        if now - self.poll_state['polled'] < self.poll_interval:
+            return
+        self.poll_state['polled'] = now
+        keys = self.channel.poll()
+        if SQLiteChannel.CLEAR_ALL in keys:
+            self.l1.clear()
+        else:
+            for key in keys:
+                self.l1.delete(key)
+        self.l1.stats['invalidations'] += len(keys)
+
+    def _broadcast(self, keys):
+        if self.channel is not None and keys:
+            self.channel.publish(keys)
+
+    def _l1_expiry(self, timeout=DEFAULT_TIMEOUT):
+        expires = time.time() + self.l1_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        return expires
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self.max_entry_size:
+            self.l1.delete(key)
+            return
+        self.l1.set(key, pickled, self._l1_expiry(timeout))
+
+    def _remember_missing(self, key):
+        self.l1.set(key, MISSING, time.time() + self.negative_timeout)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self._sync()
+        value = self.l1.get(local_key)
+        if value is MISSING:
+            return default
+        if value is not None:
+            return value
+
+        value = self.l2.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._remember_missing(local_key)
+            return default
+        self._remember(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remaining = []
+        for key in keys:
+            local_key = self.make_key(key, version=version)
+            self.validate_key(local_key)
+            value = self.l1.get(local_key)
+            if value is None:
+                remaining.append(key)
+            elif value is not MISSING:
+                found[key] = value
+        if remaining:
+            shared = self.l2.get_many(remaining, version=version)
+            for key in remaining:
+                local_key = self.make_key(key, version=version)
+                if key in shared:
+                    found[key] = shared[key]
+                    self._remember(local_key, shared[key])
+                else:
+                    self._remember_missing(local_key)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self.l2.set(key, value, timeout, version=version)
+        self._remember(local_key, value, timeout)
+        self._broadcast([local_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        local_keys = []
+        for key, value in data.items():
+            local_key = self.make_key(key, version=version)
+            local_keys.append(local_key)
+            if failed and key in failed:
+                self.l1.delete(local_key)
+            else:
+                self._remember(local_key, value, timeout)
+        self._broadcast(local_keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._remember(local_key, value, timeout)
+            self._broadcast([local_key])
+        else:
+            # Someone else holds the key; forget whatever we thought it was.
+            self.l1.delete(local_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self.l2.delete(key, version=version)
+        self.l1.delete(local_key)
+        self._broadcast([local_key])
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.l2.delete_many(keys, version=version)
+        local_keys = [self.make_key(key, version=version) for key in keys]
+        for local_key in local_keys:
+            self.l1.delete(local_key)
+        self._broadcast(local_keys)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.make_key(key, version=version)
+        self.validate_key(local_key)
+        self.l1.delete(local_key)
+        try:
+            value = self.l2.incr(key, delta, version=version)
+        finally:
+            self._broadcast([local_key])
+        return value
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        self.l2.clear()
+        self.l1.clear()
+        self._broadcast([SQLiteChannel.CLEAR_ALL])
+
+    def close(self, **kwargs):
+        self.l2.close(**kwargs)
@@ -0,0 +1,18 @@
+from . import pages
+
+
+class PageCacheMiddleware:
+    """Serve anonymous page views from the page cache (see caching/pages.py)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not pages.is_cacheable_request(request):
+            return self.get_response(request)
+
+        response = pages.get_response(request)
+        if response is None:
+            response = self.get_response(request)
+            pages.store_response(request, response)
+        return response
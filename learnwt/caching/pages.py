@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Page Cache
+
+Full-page response cache for anonymous visitors.
+
+Page output only changes when an editor publishes, so anonymous GETs of page
+types with ``cache_for_anonymous = True`` are stored whole, keyed on site,
+path and query string. Each entry remembers the page it was rendered from and
+two tokens read before rendering started:
+
+* the page's version, replaced when the page (or a child) is published,
+  unpublished or deleted;
+* the site generation, replaced when something shown on every page changes
+  (menus, snippets, images, settings) or pages move.
+
+A hit whose tokens no longer match is a miss, so purging never has to find
+every path and query string a page was cached under.
+
+The middleware runs inside the session, CSRF and message middleware, which
+only add their cookies after it has seen the response. store_response()
+therefore checks the request for a CSRF token, session or messages used
+while rendering, instead of the response for cookies.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import urlencode
+
+
+GENERATION_KEY = 'page_cache:generation'
+
+
+def version_key(page_id):
+    return f'page_cache:version:{page_id}'
+
+
+def response_key(request):
+    query = urlencode(sorted(request.GET.lists()), doseq=True)
+    location = f'{request.site.pk}:{request.path}?{query}'
+    return 'page_cache:response:' + hashlib.md5(location.encode()).hexdigest()
+
+
+def is_cacheable_request(request):
+    return (
+        request.method in ('GET', 'HEAD') and
+        getattr(request, 'site', None) is not None and
+        not request.user.is_authenticated
+    )
+
+
+def get_tokens(page_id):
+    """Return the current ``(generation, page version)`` for a page."""
+    keys = [GENERATION_KEY, version_key(page_id)]
+    tokens = cache.get_many(keys)
+    return tokens.get(keys[0]), tokens.get(keys[1])
+
+
+def start_tokens(page_id):
+    """Like get_tokens() but starts new tokens if they were never set/evicted."""
+    return tuple(page_tokens([page_id]))
+
+
+def page_tokens(page_ids):
+    """
+    Return the generation followed by the version of each page.
+
+    Anything cached alongside these tokens is out of date once they change:
+    when one of the pages is published, unpublished or deleted, or pages move.
+    """
+    keys = [GENERATION_KEY] + [version_key(page_id) for page_id in page_ids]
+    tokens = cache.get_many(keys)
+    missing = [key for key in keys if key not in tokens]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, None)
+        tokens = cache.get_many(keys)
+    return [tokens.get(key) for key in keys]
+
+
+def mark_cacheable(request, page):
+    """Called before ``page`` renders, see caching/wagtail_hooks.py."""
+    request.page_cache_tokens = (page.pk, ) + start_tokens(page.pk)
+
+
+def skip_response(request):
+    """Keep this request's response out of the page cache."""
+    if request is not None:
+        request.page_cache_tokens = None
+        # Lets the fragment cache tell whether a fragment was the reason.
+        request.page_cache_skips = skip_count(request) + 1
+
+
+def skip_count(request):
+    return getattr(request, 'page_cache_skips', 0)
+
+
+def get_response(request):
+    """Return the cached response for this request or None."""
+    entry = cache.get(response_key(request))
+    if entry is None:
+        return None
+    page_id, generation, version, content, content_type = entry
+    if (generation, version) != get_tokens(page_id):
+        return None
+    return HttpResponse(content, content_type=content_type)
+
+
+def shows_visitor_state(request):
+    """Whether the page shows the visitor's CSRF token, session or messages."""
+    if request.META.get('CSRF_COOKIE_USED'):
+        return True
+    session = getattr(request, 'session', None)
+    if session is not None and session.modified:
+        return True
+    messages = getattr(request, '_messages', None)
+    return messages is not None and (messages.used or messages.added_new)
+
+
+def store_response(request, response):
+    tokens = getattr(request, 'page_cache_tokens', None)
+    if (
+        tokens is None or
+        request.method != 'GET' or
+        request.user.is_authenticated or
+        response.status_code != 200 or
+        response.streaming or
+        response.cookies or
+        'private' in response.get('Cache-Control', '') or
+        shows_visitor_state(request)
+    ):
+        return
+    cache.set(
+        response_key(request),
+        tokens + (response.content, response['Content-Type']),
+        settings.PAGE_CACHE_TIMEOUT
+    )
+
+
+def purge_pages(page_ids):
+    """Invalidate every cached response of these pages, after commit."""
+    versions = {version_key(page_id): uuid4().hex for page_id in page_ids}
+    transaction.on_commit(lambda: cache.set_many(versions, None))
+
+
+def purge_all():
+    """Invalidate every cached page, after commit."""
+    transaction.on_commit(
+        lambda: cache.set(GENERATION_KEY, uuid4().hex, None)
+    )
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Fragment Registry
+
+Declares what each {% cache %} fragment in our templates is built from, so a
+change to any of those models purges exactly the keys that show it.
+
+Apps register their fragments in a ``fragments.py`` module:
+
+    fragments.register(
+        'blog_post_preview',
+        Dependency(BlogDetailPage, fields=['custom_title'],
+                   vary_on=lambda post: [[post.pk]]),
+    )
+
+``vary_on`` returns the vary-on lists (the arguments after the fragment name
+in the template tag) affected by a change to an instance; an empty list means
+the change doesn't touch the fragment. Without ``vary_on`` the fragment has a
+single, unvaried key. The signal handlers in caching/signals.py do the rest.
+"""
+from logging import getLogger
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import transaction
+
+
+logger = getLogger(__name__)
+
+# Image fields that change how a rendition of the image looks.
+RENDITION_FIELDS = [
+    'title', 'file', 'focal_point_x', 'focal_point_y', 'focal_point_width',
+    'focal_point_height',
+]
+
+
+def unvaried(instance):
+    """Vary-on for fragments cached without any extra arguments."""
+    return [[]]
+
+
+class Dependency:
+    """A model a fragment is built from."""
+
+    def __init__(self, model, fields=None, vary_on=unvaried):
+        self.model = model
+        # None means any change to the model matters.
+        self.fields = set(fields) if fields is not None else None
+        self.vary_on = vary_on
+
+    def affected_by(self, changed_fields):
+        """Whether a change to ``changed_fields`` (None: unknown) matters."""
+        if self.fields is None or changed_fields is None:
+            return True
+        return bool(self.fields & set(changed_fields))
+
+
+class FragmentRegistry:
+    """Map template fragments to the models and fields they depend on."""
+
+    def __init__(self):
+        self.fragments = {}
+
+    def register(self, name, *dependencies):
+        self.fragments.setdefault(name, []).extend(dependencies)
+
+    def dependencies_for(self, instance):
+        """Yield ``(fragment name, dependency)`` pairs matching ``instance``."""
+        for name, dependencies in self.fragments.items():
+            for dependency in dependencies:
+                if isinstance(instance, dependency.model):
+                    yield name, dependency
+
+    def tracked_fields(self, model):
+        """Return the concrete fields of ``model`` worth snapshotting before a save."""
+        fields = set()
+        for dependencies in self.fragments.values():
+            for dependency in dependencies:
+                if issubclass(model, dependency.model) and dependency.fields:
+                    fields |= dependency.fields
+        concrete = {
+            field.name: field.attname
+            for field in model._meta.concrete_fields
+        }
+        return {name: concrete[name] for name in fields if name in concrete}
+
+    def keys_for(self, instance, changed_fields=None, with_fields=None):
+        """
+        Return the fragment cache keys a change to ``instance`` invalidates.
+
+        ``with_fields`` limits the lookup to dependencies that do (True) or
+        do not (False) declare fields.
+        """
+        keys = set()
+        for name, dependency in self.dependencies_for(instance):
+            if with_fields is not None and with_fields != bool(dependency.fields):
+                continue
+            if not dependency.affected_by(changed_fields):
+                continue
+            for vary_on in dependency.vary_on(instance):
+                keys.add(make_template_fragment_key(name, vary_on))
+        return keys
+
+    def purge(self, instance, changed_fields=None, with_fields=None):
+        """
+        Delete the affected keys once the current transaction commits.
+
+        Returns the keys, so callers can tell whether anything was affected.
+        """
+        keys = self.keys_for(instance, changed_fields, with_fields)
+        if not keys:
+            return keys
+
+        def delete_keys():
+            logger.info(f'{instance!r} changed. Deleting cache {sorted(keys)}')
+            cache.delete_many(list(keys))
+
+        transaction.on_commit(delete_keys)
+        return keys
+
+
+fragments = FragmentRegistry()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Cache Signals
+
+Purge registered fragments (see caching/registry.py) and cached pages (see
+caching/pages.py) when the content they show changes.
+
+Pages only change what visitors see when they are published, unpublished or
+deleted, so dependencies on page models without declared fields fire on those
+events rather than on every draft save; such an event purges the cached page
+and its parent (which lists it). Dependencies with declared fields fire
+whenever one of those fields really changes, which also catches page moves.
+Only models with such fields get the pre_save receiver, and it compares with
+the values the instance was loaded with (caching/tracking.py).
+Any other fragment change may show up on every page (navigation, side nav,
+cards), so it purges the whole page cache. Adding or removing a view
+restriction purges the page and everything below it, which it hides.
+
+The API response cache (caching/api.py) is purged by the same page events
+and view restriction changes, and by changes to the other content the API
+shows, see API_CONTENT.
+"""
+from django.apps import apps
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from modelcluster.fields import ParentalKey
+from wagtail.contrib.settings.models import BaseSetting
+from wagtail.core.models import Collection, Page, PageViewRestriction, Site
+from wagtail.core.signals import page_published, page_unpublished
+from wagtail.documents.models import AbstractDocument
+from wagtail.images.models import AbstractImage
+from wagtail.snippets.models import get_snippet_models
+
+from . import api, pages
+from .registry import fragments
+from .tracking import stored_values, track
+
+
+def purge_page(page):
+    """Purge a page that changed and the parent listing it."""
+    if page.numchild:
+        # Its title and URL show up, and its URL is part of, every page below.
+        pages.purge_all()
+        return
+    page_ids = [page.pk]
+    parent = page.get_parent()
+    if parent is not None:
+        page_ids.append(parent.pk)
+    pages.purge_pages(page_ids)
+
+
+def is_page_content(instance):
+    """
+    Pages and their inline children (authors, carousel images) only change
+    live content when a page is published, which purge_published() handles.
+    """
+    if isinstance(instance, Page):
+        return True
+    return any(
+        isinstance(field, ParentalKey) and issubclass(field.related_model, Page)
+        for field in instance._meta.concrete_fields
+    )
+
+
+def snapshot_tracked_fields(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored values of the fields fragments depend on."""
+    # New rows have nothing to compare and post_save trusts update_fields.
+    if instance._state.adding or update_fields is not None:
+        return
+    tracked = fragments.tracked_fields(sender)
+    instance._fragment_snapshot = stored_values(instance, list(tracked))
+
+
+def connect_tracked_models():
+    """Snapshot the models with tracked fields, once the fragments are registered."""
+    for model in apps.get_models():
+        tracked = fragments.tracked_fields(model)
+        if tracked:
+            track(model, list(tracked))
+            pre_save.connect(snapshot_tracked_fields, sender=model)
+
+
+@receiver(post_save)
+def purge_saved(sender, instance, created, update_fields=None, **kwargs):
+    if isinstance(instance, BaseSetting):
+        pages.purge_all()
+        return
+
+    changed_fields = None
+    if update_fields is not None:
+        changed_fields = set(update_fields)
+    elif not created and getattr(instance, '_fragment_snapshot', None):
+        snapshot = instance._fragment_snapshot
+        changed_fields = {
+            name for name, attname in fragments.tracked_fields(sender).items()
+            if snapshot[name] != getattr(instance, attname)
+        }
+    instance._fragment_snapshot = None
+
+    if isinstance(instance, Page):
+        if fragments.purge(instance, changed_fields, with_fields=True):
+            pages.purge_all()
+    elif fragments.purge(instance, changed_fields):
+        if not is_page_content(instance):
+            pages.purge_all()
+
+
+@receiver(pre_delete)
+def purge_deleted(sender, instance, **kwargs):
+    # Before the delete cascades, while vary_on can still find related rows.
+    keys = fragments.purge(instance)
+    if isinstance(instance, Page):
+        purge_page(instance)
+        api.purge_pages()
+    elif keys and not is_page_content(instance):
+        pages.purge_all()
+
+
+@receiver(m2m_changed)
+def purge_m2m_changed(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if fragments.purge(instance):
+            pages.purge_all()
+        return
+    changed_fields = {
+        field.name for field in instance._meta.many_to_many
+        if field.remote_field.through is sender
+    }
+    keys = fragments.purge(instance, changed_fields)
+    if isinstance(instance, Page):
+        purge_page(instance)
+    elif keys:
+        pages.purge_all()
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def purge_published(sender, instance, **kwargs):
+    fragments.purge(instance, with_fields=False)
+    purge_page(instance)
+    api.purge_pages()
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def purge_restricted(sender, instance, **kwargs):
+    """A restriction hides the page and every page below it from visitors."""
+    purge_page(instance.page)
+    # And from the API, which only lists public pages.
+    api.purge_pages()
+
+
+# Models other than pages whose changes show up in API responses.
+API_CONTENT = (AbstractImage, AbstractDocument, Collection, Site, BaseSetting)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def purge_api_content(sender, instance, **kwargs):
+    if isinstance(instance, API_CONTENT) or sender in get_snippet_models():
+        api.purge_content()
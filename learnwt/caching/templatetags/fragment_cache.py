@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Fragment Cache Tag
+
+A drop-in replacement for Django's ``{% cache %}`` tag that keeps a purge or
+expiry from sending every worker to the database at once:
+
+* one worker at a time (whoever takes the lock) re-renders a fragment, while
+  the others keep serving the last rendered copy;
+* fragments are re-rendered a little before they expire, earlier the longer
+  they took to render ("probabilistic early expiration"), so fragments cached
+  at the same moment don't all expire together.
+
+    {% load fragment_cache %}
+    {% cache 604800 side_nav %}...{% endcache %}
+
+Keys are the same as Django's, so caching/registry.py purges still apply. A
+purge only drops the fresh copy; the stale copy lives on under STALE_SUFFIX.
+"""
+import math
+import random
+import time
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Library, TemplateSyntaxError, VariableDoesNotExist
+from django.templatetags.cache import CacheNode, do_cache
+
+from .. import pages
+
+
+register = Library()
+
+STALE_SUFFIX = ':stale'
+LOCK_SUFFIX = ':lock'
+# Longest a worker may hold a fragment's lock before someone else may render.
+LOCK_TIMEOUT = 30
+# How long the stale copy outlives the fresh one.
+STALE_GRACE = 60 * 60 * 24
+# Higher values refresh earlier, 1 is the usual choice.
+EARLY_EXPIRY_BETA = 1.0
+# Lifetime of fragments that kept their page out of the page cache, e.g.
+# because they link to renditions still being generated.
+INCOMPLETE_TIMEOUT = 60
+
+
+def is_fresh(entry, now=None):
+    """Whether a cached ``(content, expires, render time, ...)`` is still fresh."""
+    content, expires, delta, incomplete = entry
+    if expires is None:
+        return True
+    now = time.time() if now is None else now
+    # 1 - random() is in (0, 1], log() of it is <= 0.
+    return now - delta * EARLY_EXPIRY_BETA * math.log(1 - random.random()) < expires
+
+
+class StaleWhileRevalidateNode(CacheNode):
+
+    def get_expire_time(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError('"cache" tag got an unknown variable: %r' % self.expire_time_var.var)
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise TemplateSyntaxError('"cache" tag got a non-integer timeout value: %r' % expire_time)
+        return expire_time
+
+    def get_fragment_cache(self, context):
+        if self.cache_name:
+            try:
+                cache_name = self.cache_name.resolve(context)
+            except VariableDoesNotExist:
+                raise TemplateSyntaxError('"cache" tag got an unknown variable: %r' % self.cache_name.var)
+            try:
+                return caches[cache_name]
+            except InvalidCacheBackendError:
+                raise TemplateSyntaxError('Invalid cache name specified for cache tag: %r' % cache_name)
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def render(self, context):
+        expire_time = self.get_expire_time(context)
+        fragment_cache = self.get_fragment_cache(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        stale_key = cache_key + STALE_SUFFIX
+        lock_key = cache_key + LOCK_SUFFIX
+
+        entries = fragment_cache.get_many([cache_key, stale_key])
+        entry = entries.get(cache_key)
+        if entry is not None and is_fresh(entry):
+            if entry[3]:
+                pages.skip_response(context.get('request'))
+            return entry[0]
+
+        if not fragment_cache.add(lock_key, True, LOCK_TIMEOUT):
+            # Someone else is rendering it, serve what we have.
+            content = entry[0] if entry is not None else entries.get(stale_key)
+            if content is not None:
+                if entry is None or entry[3]:
+                    # Don't let the page cache keep a page with a purged fragment.
+                    pages.skip_response(context.get('request'))
+                return content
+            return self.nodelist.render(context)
+
+        try:
+            request = context.get('request')
+            skips = pages.skip_count(request)
+            started = time.time()
+            content = self.nodelist.render(context)
+            now = time.time()
+            incomplete = pages.skip_count(request) > skips
+            if incomplete:
+                expire_time = min(expire_time or INCOMPLETE_TIMEOUT, INCOMPLETE_TIMEOUT)
+            expires = now + expire_time if expire_time is not None else None
+            stale_time = expire_time + STALE_GRACE if expire_time is not None else None
+            fragment_cache.set(
+                cache_key, (content, expires, now - started, incomplete), expire_time
+            )
+            fragment_cache.set(stale_key, content, stale_time)
+        finally:
+            fragment_cache.delete(lock_key)
+        return content
+
+
+@register.tag('cache')
+def do_fragment_cache(parser, token):
+    """
+    Cache a template fragment, serving stale content while it's refreshed.
+
+    Takes the same arguments as Django's ``{% cache %}`` tag.
+    """
+    node = do_cache(parser, token)
+    return StaleWhileRevalidateNode(
+        node.nodelist, node.expire_time_var, node.fragment_name, node.vary_on,
+        node.cache_name,
+    )
@@ -0,0 +1,357 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+from uuid import uuid4
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template import Context, Template
+from django.test import (
+    RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.core.models import Page, PageViewRestriction
+
+from learnwt.testing import create_post, create_site, test_settings
+
+from blog.models import BlogCategory, BlogDetailPage
+
+from . import pages
+from .backends import TwoTierCache
+from .templatetags import fragment_cache
+
+
+def capture_save(instance):
+    """Return the queries of saving ``instance``, not those run after commit."""
+    with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+        instance.save()
+    return queries
+
+
+def selects_from(queries, table):
+    """The captured queries reading a single row of ``table``."""
+    return [
+        query['sql'] for query in queries
+        if query['sql'].startswith('SELECT')
+        and f'FROM "{table}" WHERE "{table}"."id" =' in query['sql']
+    ]
+
+
+@test_settings
+class FragmentRegistryTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        categories = [BlogCategory.objects.create(name=f'Category {i}') for i in range(2)]
+        self.posts = [
+            create_post(self.site.listing, i, self.site.image, categories[:1]) for i in range(2)
+        ]
+        self.keys = [
+            make_template_fragment_key('blog_post_preview', [post.pk])
+            for post in self.posts
+        ]
+        cache.set_many(dict.fromkeys(self.keys, 'card'))
+
+    def test_tracked_field_change_purges(self):
+        category = BlogCategory.objects.get(name='Category 0')
+        category.name = 'Renamed'
+        category.save()
+        self.assertEqual(cache.get_many(self.keys), {})
+
+    def test_other_changes_dont_purge(self):
+        category = BlogCategory.objects.get(name='Category 1')
+        category.name = 'Renamed'
+        category.save()
+        category = BlogCategory.objects.get(name='Category 0')
+        category.save()
+        self.assertEqual(len(cache.get_many(self.keys)), 2)
+
+    def test_loaded_values_are_compared_without_a_query(self):
+        category = BlogCategory.objects.get(name='Category 0')
+        category.name = 'Renamed'
+        queries = capture_save(category)
+        self.assertEqual(selects_from(queries, 'blog_blogcategory'), [])
+        category.name = 'Category 0'
+        category.save()
+        self.assertEqual(cache.get_many(self.keys), {})
+
+    def test_instances_not_loaded_are_looked_up(self):
+        category = BlogCategory.objects.get(name='Category 0')
+        # Like the page object of a revision being published.
+        copy = BlogCategory(pk=category.pk, name='Renamed')
+        copy._state.adding = False
+        queries = capture_save(copy)
+        self.assertEqual(len(selects_from(queries, 'blog_blogcategory')), 1)
+        self.assertEqual(cache.get_many(self.keys), {})
+
+    def test_published_revisions_are_looked_up(self):
+        key = make_template_fragment_key('navigation')
+        home = self.site.home
+        home.save_revision().publish()
+        cache.set(key, 'navbar')
+        self.assertEqual(cache.get(key), 'navbar')
+        home.banner_title = 'Welcome'
+        home.save_revision().publish()
+        self.assertIsNone(cache.get(key))
+
+    def test_page_saves_dont_query_their_url_path(self):
+        post = BlogDetailPage.objects.get(pk=self.posts[0].pk)
+        post.custom_title = 'Changed'
+        queries = capture_save(post)
+        # Wagtail itself loads the page once to compare slugs.
+        self.assertEqual(len(selects_from(queries, 'wagtailcore_page')), 1)
+
+
+@test_settings
+class PageCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        self.post = self.posts[0]
+
+    def get(self, path):
+        return self.client.get(path, HTTP_HOST='localhost')
+
+    def warm(self, *paths):
+        """Cache ``paths``, once the renditions they show exist."""
+        for path in paths + paths:
+            self.get(path)
+
+    def retitle_unseen(self, page, title):
+        """Change a page without any signal, so only a fresh render shows it."""
+        Page.objects.filter(pk=page.pk).update(title=title)
+        BlogDetailPage.objects.filter(pk=page.pk).update(custom_title=title)
+
+    def test_anonymous_views_are_cached(self):
+        self.warm('/blog/post-0/')
+        self.retitle_unseen(self.post, 'Unseen')
+        self.assertNotContains(self.get('/blog/post-0/'), 'Unseen')
+        self.client.force_login(User.objects.create_user('editor'))
+        self.assertContains(self.get('/blog/post-0/'), 'Unseen')
+
+    def test_publish_purges_the_page_and_its_parent(self):
+        self.warm('/blog/post-0/', '/blog/', '/blog/post-1/')
+        self.retitle_unseen(self.posts[1], 'Unseen')
+        self.post.custom_title = 'Published'
+        self.post.save_revision().publish()
+        self.assertContains(self.get('/blog/post-0/'), 'Published')
+        self.assertContains(self.get('/blog/'), 'Published')
+        self.assertNotContains(self.get('/blog/post-1/'), 'Unseen')
+
+    def test_unpublish_purges(self):
+        self.warm('/blog/post-0/', '/blog/')
+        self.post.unpublish()
+        self.assertEqual(self.get('/blog/post-0/').status_code, 404)
+        self.assertNotContains(self.get('/blog/'), 'Post 0')
+
+    def test_move_purges(self):
+        self.warm('/blog/post-0/', '/blog/')
+        self.post.move(self.site.home, pos='last-child')
+        self.assertEqual(self.get('/blog/post-0/').status_code, 404)
+        self.assertEqual(self.get('/post-0/').status_code, 200)
+        # The listing shows every post, now with its new URL.
+        self.assertNotContains(self.get('/blog/'), '"/blog/post-0/"')
+        self.assertContains(self.get('/blog/'), '"/post-0/"')
+
+    def test_view_restriction_purges_the_page_and_below(self):
+        self.warm('/blog/', '/blog/post-0/')
+        restriction = PageViewRestriction.objects.create(
+            page=self.site.listing, restriction_type=PageViewRestriction.LOGIN
+        )
+        self.assertEqual(self.get('/blog/').status_code, 302)
+        self.assertEqual(self.get('/blog/post-0/').status_code, 302)
+        restriction.delete()
+        self.assertEqual(self.get('/blog/post-0/').status_code, 200)
+
+    def test_leaf_view_restriction(self):
+        self.warm('/blog/post-0/')
+        PageViewRestriction.objects.create(
+            page=self.post, restriction_type=PageViewRestriction.PASSWORD,
+            password='secret'
+        )
+        response = self.get('/blog/post-0/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'Body of post 0')
+        self.assertEqual(pages.get_response(self.get_request('/blog/post-0/')), None)
+
+    def get_request(self, path):
+        request = RequestFactory().get(path)
+        request.site = self.site.site
+        request.user = AnonymousUser()
+        return request
+
+    def test_responses_showing_a_csrf_token_are_not_stored(self):
+        request = self.get_request('/contact/')
+        pages.mark_cacheable(request, self.site.home)
+        get_token(request)
+        pages.store_response(request, HttpResponse('<form>token</form>'))
+        self.assertIsNone(pages.get_response(self.get_request('/contact/')))
+
+        request = self.get_request('/contact/')
+        pages.mark_cacheable(request, self.site.home)
+        pages.store_response(request, HttpResponse('<p>no form</p>'))
+        self.assertIsNotNone(pages.get_response(self.get_request('/contact/')))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-tests',
+    },
+})
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='learnwt-channel-')
+        self.addCleanup(shutil.rmtree, directory)
+        self.channel = os.path.join(directory, 'invalidations.sqlite3')
+        self.shared = caches['shared']
+        self.shared.clear()
+        # Two workers: their own L1 stores, one shared cache and channel.
+        self.a = self.worker()
+        self.b = self.worker()
+
+    def worker(self, **options):
+        options = dict({
+            'SHARED_CACHE': 'shared', 'CHANNEL': self.channel, 'POLL_INTERVAL': 0,
+        }, **options)
+        return TwoTierCache(f'test-{uuid4().hex}', {'OPTIONS': options})
+
+    def test_reads_come_from_l1(self):
+        self.a.set('key', 'first')
+        self.shared.set('key', 'changed behind its back')
+        self.assertEqual(self.a.get('key'), 'first')
+        self.assertEqual(self.a.stats()['hits'], 1)
+
+    def test_misses_are_remembered(self):
+        self.assertIsNone(self.a.get('key'))
+        self.shared.set('key', 'changed behind its back')
+        self.assertIsNone(self.a.get('key'))
+        self.assertEqual(self.a.stats()['negative_hits'], 1)
+
+    def test_writes_invalidate_other_workers(self):
+        self.assertIsNone(self.a.get('key'))
+        self.b.set('key', 'first')
+        self.assertEqual(self.a.get('key'), 'first')
+        self.b.set('key', 'second')
+        self.assertEqual(self.a.get('key'), 'second')
+        self.b.delete('key')
+        self.assertIsNone(self.a.get('key'))
+        self.assertEqual(self.a.stats()['invalidations'], 3)
+
+    def test_incr_and_set_many_invalidate_other_workers(self):
+        self.b.set_many({'count': 1, 'other': 'first'})
+        self.assertEqual(self.a.get_many(['count', 'other']), {'count': 1, 'other': 'first'})
+        self.b.incr('count')
+        self.b.set_many({'other': 'second'})
+        self.assertEqual(self.a.get_many(['count', 'other']), {'count': 2, 'other': 'second'})
+
+    def test_clear_empties_other_workers(self):
+        self.a.set('key', 'first')
+        self.b.get('key')
+        self.b.clear()
+        self.assertIsNone(self.a.get('key'))
+
+    def test_missed_invalidations_empty_l1(self):
+        self.a.set('key', 'first')
+        self.a.get('other')
+        self.b.set('key', 'second')
+        # Pruned before the first worker read them.
+        with sqlite3.connect(self.channel) as connection:
+            connection.execute('DELETE FROM invalidations')
+        self.b.set('unrelated', 'value')
+        self.assertEqual(self.a.get('key'), 'second')
+
+    def test_size_bound(self):
+        worker = self.worker(MAX_SIZE=1000, MAX_ENTRY_SIZE=300)
+        worker.set('large', 'x' * 500)
+        for number in range(10):
+            worker.set(f'key-{number}', 'x' * 100)
+        stats = worker.stats()
+        self.assertLessEqual(stats['size'], 1000)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertNotIn(worker.make_key('large'), worker.l1.entries)
+        self.assertNotIn(worker.make_key('key-0'), worker.l1.entries)
+        self.assertEqual(worker.get('key-0'), 'x' * 100)
+
+
+class Counter:
+    """Renders as how often it was rendered."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return str(self.count)
+
+
+@test_settings
+class FragmentCacheTagTests(SimpleTestCase):
+
+    template = Template('{% load fragment_cache %}{% cache 600 counted %}{{ counter }}{% endcache %}')
+    key = make_template_fragment_key('counted')
+
+    def setUp(self):
+        cache.clear()
+        self.counter = Counter()
+
+    def render(self, request=None):
+        return self.template.render(Context({'counter': self.counter, 'request': request}))
+
+    def test_fragments_are_cached(self):
+        self.assertEqual(self.render(), '1')
+        self.assertEqual(self.render(), '1')
+        self.assertIsNone(cache.get(self.key + fragment_cache.LOCK_SUFFIX))
+
+    def test_one_worker_renders_a_purged_fragment(self):
+        self.render()
+        cache.delete(self.key)
+        # Another worker holds the lock: serve the stale copy, don't cache the page.
+        cache.add(self.key + fragment_cache.LOCK_SUFFIX, True)
+        request = RequestFactory().get('/')
+        request.page_cache_tokens = (1, 'generation', 'version')
+        self.assertEqual(self.render(request), '1')
+        self.assertIsNone(request.page_cache_tokens)
+        cache.delete(self.key + fragment_cache.LOCK_SUFFIX)
+        self.assertEqual(self.render(), '2')
+
+    def test_renders_when_nothing_is_cached_to_serve(self):
+        cache.add(self.key + fragment_cache.LOCK_SUFFIX, True)
+        self.assertEqual(self.render(), '1')
+        self.assertEqual(self.render(), '2')
+
+    def test_fragments_refresh_early_near_expiry(self):
+        self.assertTrue(fragment_cache.is_fresh(('content', None, 1, False)))
+        now = time.time()
+        entry = ('content', now + 1, 0.5, False)
+        with mock.patch('random.random', return_value=0.0):
+            self.assertTrue(fragment_cache.is_fresh(entry, now))
+        with mock.patch('random.random', return_value=0.99):
+            # -0.5 * log(0.01) is about 2.3 seconds early.
+            self.assertFalse(fragment_cache.is_fresh(entry, now))
+        self.assertTrue(fragment_cache.is_fresh(('content', now + 60, 0.5, False), now))
+
+    def test_incomplete_fragments_expire_soon_and_skip_the_page_cache(self):
+        template = Template(
+            '{% load fragment_cache %}{% cache 600 counted %}{{ skip }}{% endcache %}'
+        )
+        request = RequestFactory().get('/')
+        template.render(Context({'request': request, 'skip': lambda: pages.skip_response(request)}))
+        content, expires, delta, incomplete = cache.get(self.key)
+        self.assertTrue(incomplete)
+        self.assertLessEqual(expires, time.time() + fragment_cache.INCOMPLETE_TIMEOUT)
+        request = RequestFactory().get('/')
+        request.page_cache_tokens = (1, 'generation', 'version')
+        template.render(Context({'request': request}))
+        self.assertIsNone(request.page_cache_tokens)
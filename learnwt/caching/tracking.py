@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Stored Field Values
+
+Receivers that purge on what a save changed need the values the row held
+before it. Instead of a SELECT in every pre_save, instances of the models an
+app tracks keep the values of the tracked fields they were loaded with
+(Model.from_db()), moved on after each save:
+
+    track(Page, ['url_path'])          # in AppConfig.ready()
+    stored_values(page, ['url_path'])  # in pre_save, {'url_path': ...}
+
+Instances that weren't loaded from the database, like the page object of a
+revision being published, and deferred fields are still looked up.
+"""
+from functools import wraps
+
+from django.apps import apps
+from django.db.models.signals import post_init, post_save
+
+
+# model -> {field name: attname}
+_tracked = {}
+
+
+def loaded_from_db(from_db):
+    """Wrap a model's from_db() to mark the instances it loads."""
+    @wraps(from_db)
+    def wrapper(cls, db, field_names, values):
+        instance = from_db(cls, db, field_names, values)
+        instance._stored_values_loaded = True
+        return instance
+    wrapper.marks_loaded = True
+    return wrapper
+
+
+def track(model, names):
+    """Keep the stored values of ``names`` on instances of ``model`` and its subclasses."""
+    if not getattr(model.from_db, 'marks_loaded', False):
+        model.from_db = classmethod(loaded_from_db(model.from_db.__func__))
+    for other in apps.get_models():
+        if not issubclass(other, model):
+            continue
+        concrete = {field.name: field.attname for field in other._meta.concrete_fields}
+        _tracked.setdefault(other, {}).update(
+            {name: concrete[name] for name in names if name in concrete}
+        )
+        post_init.connect(remember_values, sender=other)
+        post_save.connect(remember_values, sender=other)
+
+
+def remember_values(sender, instance, update_fields=None, **kwargs):
+    """Once loaded or saved, what an instance holds is what's stored."""
+    attnames = _tracked[sender]
+    stored = {}
+    if update_fields is not None:
+        if not getattr(instance, '_stored_values_loaded', False):
+            # The fields that weren't saved may never have been stored.
+            return
+        stored = instance._stored_values
+        attnames = {name: attnames[name] for name in update_fields if name in attnames}
+    elif 'created' in kwargs:
+        # Saved whole (post_save, not post_init), so everything is stored.
+        instance._stored_values_loaded = True
+    values = instance.__dict__
+    stored.update({
+        attname: values[attname] for attname in attnames.values() if attname in values
+    })
+    instance._stored_values = stored
+
+
+def stored_values(instance, names):
+    """Return the stored values of the fields ``names`` of a saved instance."""
+    attnames = _tracked.get(type(instance), {})
+    stored = getattr(instance, '_stored_values', {})
+    if getattr(instance, '_stored_values_loaded', False) and all(
+        name in attnames and attnames[name] in stored for name in names
+    ):
+        return {name: stored[attnames[name]] for name in names}
+    return type(instance)._default_manager.filter(
+        pk=instance.pk
+    ).values(*names).first()
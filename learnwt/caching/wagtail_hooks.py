@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Page cache hooks
+
+Tell the page cache which page a request is rendering and drop every cached
+page and API response when pages move (their URLs, and their descendants',
+change).
+"""
+from wagtail.core import hooks
+
+from . import api, pages
+
+
+@hooks.register('before_serve_page')
+def mark_cacheable_page(page, request, serve_args, serve_kwargs):
+    if not getattr(page, 'cache_for_anonymous', False):
+        return
+    if not pages.is_cacheable_request(request):
+        return
+    # Never cache the password/login form of a restricted page.
+    if page.get_view_restrictions().exists():
+        return
+    pages.mark_cacheable(request, page)
+
+
+@hooks.register('after_move_page')
+def purge_moved_page(request, page):
+    pages.purge_all()
+    api.purge_content()
@@ -12,12 +12,15 @@ from wagtail.core.fields import StreamField
 from wagtail.admin.edit_handlers import FieldPanel, StreamFieldPanel
 
 from streams import blocks
+from streams.references import resolve_references
 
 
 class FlexPage(Page):
     """Define flexible page class."""
 
     template = "flex/flex_page.html"
+    # Anonymous views are served from the page cache (caching/pages.py).
+    cache_for_anonymous = True
 
     content = StreamField([
         ("title_and_text", blocks.TitleAndTextBlock()),
@@ -35,6 +38,12 @@ class FlexPage(Page):
         StreamFieldPanel('content')
     ]
 
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        # Load every page the blocks link to in one go.
+        resolve_references(self.content, request)
+        return context
+
     class Meta:  # noqa
         verbose_name = "Flex Page"
         verbose_name_plural = "Flex Pages"
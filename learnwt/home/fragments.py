@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Home Fragments
+
+Cached template fragments built from the home page (see caching/registry.py).
+"""
+from wagtail.images import get_image_model
+
+from caching.registry import Dependency, RENDITION_FIELDS, fragments
+
+from .models import HomePage, HomePageCarousel
+
+
+def carousel_pages(image):
+    """Vary-on lists for every home page showing ``image`` in its slider."""
+    pages = HomePageCarousel.objects.filter(carousel_image=image)
+    return [[pk] for pk in pages.values_list('page_id', flat=True).distinct()]
+
+
+# home_page.html: {% cache 604800 home_slider self.id %}
+fragments.register(
+    'home_slider',
+    Dependency(HomePage, vary_on=lambda page: [[page.pk]]),
+    Dependency(HomePageCarousel, vary_on=lambda item: [[item.page_id]]),
+    Dependency(
+        get_image_model(), fields=RENDITION_FIELDS, vary_on=carousel_pages
+    ),
+)
+
+# navbar.html: {% cache 604800 navigation %}
+fragments.register(
+    'navigation',
+    Dependency(HomePage, fields=['banner_title']),
+)
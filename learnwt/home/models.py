@@ -15,8 +15,10 @@ from wagtail.admin.edit_handlers import (
 from wagtail.core.fields import RichTextField, StreamField
 from wagtail.images.edit_handlers import ImageChooserPanel
 from wagtail.contrib.routable_page.models import RoutablePageMixin, route
+from renditions.prefetch import prefetch_renditions
 from subscribers.models import Subscriber
 from streams import blocks
+from streams.references import resolve_references
 
 
 
@@ -67,6 +69,8 @@ class HomePage(RoutablePageMixin, Page):
     """
     template = 'home/home_page.html'
     max_count = 1  # Restrict instances of this page to a single instance.
+    # Anonymous views are served from the page cache (caching/pages.py).
+    cache_for_anonymous = True
     # FIELDS
     banner_title = models.CharField(max_length=100, blank=False, null=True)
     banner_subtitle = RichTextField(features=['bold', 'italic'])
@@ -120,10 +124,24 @@ class HomePage(RoutablePageMixin, Page):
         StreamFieldPanel('content'),
     ]
 
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        # Load every page the blocks link to in one go.
+        resolve_references(self.content, request)
+        return context
+
     class Meta:
         verbose_name = "Home Page"
         verbose_name_plural = "Home Pages"
 
+    def carousel_items(self):
+        """Carousel slides with their images, for the home_slider fragment."""
+        items = list(self.carousel_images.select_related('carousel_image'))
+        prefetch_renditions(
+            [item.carousel_image for item in items], 'fill-1200x800'
+        )
+        return items
+
     @route(r'^subscribe/$')
     def subscribe_page(self, request, *args, **kwargs):
         context = self.get_context(request, *args, **kwargs)
@@ -3,16 +3,243 @@
 REST API Configuration
 
 Configure REST API endpoints for our blog.
+
+Every endpoint is served from the API response cache (caching/api.py), with
+ETags and Last-Modified dates for conditional requests. Pages load what the
+requested fields show for all results at once (learnwt/api_prefetch.py),
+and skip the columns they don't.
+
+/api/v2/pages/export/ streams every live page of a type as newline-delimited
+JSON, for downstream systems syncing our content:
+
+    /api/v2/pages/export/?type=blog.BlogDetailPage&fields=*&since=<date>
+
+Pages come oldest change first, each with its ``last_published_at`` in
+``meta``, so a sync that stops can resume from the last one it got.
+
+Every endpoint also answers in MessagePack (learnwt/renderers.py) when asked,
+and shows rendition URLs of its images for ``renditions=<spec>,...``
+(renditions/api.py).
 """
+from itertools import islice
+
+from django.conf import settings
+from django.conf.urls import url
+from django.db.models import Max, QuerySet
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 from wagtail.api.v2.endpoints import PagesAPIEndpoint
 from wagtail.api.v2.router import WagtailAPIRouter
+from wagtail.api.v2.utils import BadRequestError, parse_fields_parameter
 from wagtail.images.api.v2.endpoints import ImagesAPIEndpoint
 from wagtail.documents.api.v2.endpoints import DocumentsAPIEndpoint
+from wagtail.core.models import Page
+
+from caching.api import (
+    CachedEndpointMixin, cached_representations, content_changed_at
+)
+
+from renditions.api import RenditionsField, requested_specs
+
+from .api_prefetch import get_deferred_fields, prefetch_for_serializer
+from .renderers import MessagePackRenderer
+
+
+RENDERER_CLASSES = [JSONRenderer, MessagePackRenderer, BrowsableAPIRenderer]
+
+
+class CachedPagesAPIEndpoint(CachedEndpointMixin, PagesAPIEndpoint):
+    renderer_classes = RENDERER_CLASSES
+    known_query_parameters = PagesAPIEndpoint.known_query_parameters.union([
+        'renditions',
+    ])
+    export_query_parameters = frozenset(['type', 'fields', 'since', 'renditions'])
+    # Pages serialised per query, and per prefetch of what they show.
+    export_chunk_size = 500
+
+    @classmethod
+    def get_urlpatterns(cls):
+        return [
+            url(r'^export/$', cls.as_view({'get': 'export_view'}), name='export'),
+        ] + super().get_urlpatterns()
+
+    def export_view(self, request):
+        """Stream the pages as one JSON object per line, see the module docstring."""
+        unknown_parameters = set(request.GET.keys()) - self.export_query_parameters
+        if unknown_parameters:
+            raise BadRequestError(
+                "query parameter is not an operation or a recognised field: %s"
+                % ', '.join(sorted(unknown_parameters))
+            )
+        queryset = self.get_queryset().defer(
+            *get_deferred_fields(self.get_serializer_class())
+        )
+        if 'since' in request.GET:
+            since = parse_datetime(request.GET['since'])
+            if since is None:
+                raise BadRequestError("since must be a date and time")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            # Including the page the last sync ended on, it may share its date.
+            queryset = queryset.filter(last_published_at__gte=since)
+        queryset = queryset.order_by('last_published_at', 'id')
+        response = StreamingHttpResponse(
+            self.export_lines(queryset), content_type='application/x-ndjson'
+        )
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    def export_lines(self, queryset):
+        encoder = JSONEncoder(ensure_ascii=False)
+        # A server-side cursor, read a chunk at a time.
+        pages = queryset.iterator(chunk_size=self.export_chunk_size)
+        while True:
+            chunk = list(islice(pages, self.export_chunk_size))
+            if not chunk:
+                break
+            for page, data in zip(chunk, self.serialize(chunk)):
+                data.setdefault('meta', {})['last_published_at'] = page.last_published_at
+                yield encoder.encode(data) + '\n'
+
+    def listing_view(self, request):
+        queryset = self.get_queryset()
+        self.check_query_parameters(queryset)
+        queryset = self.filter_queryset(queryset)
+        pages = list(self.paginate_queryset(queryset))
+        return self.get_paginated_response(self.serialize(pages))
+
+    def detail_view(self, request, pk):
+        return Response(self.serialize([self.get_object()])[0])
+
+    def serialize(self, pages):
+        """
+        Return the representations of ``pages``, loading what they show in
+        bulk, and reusing those cached at the pages' live revisions.
+        """
+        serializer_class = self.get_serializer_class()
+
+        def serialize(pages):
+            prefetch_for_serializer(pages, serializer_class, self.request)
+            serializer = serializer_class(context=self.get_serializer_context())
+            return [serializer.to_representation(page) for page in pages]
+
+        # The parent is shown as it is now, not as of this page's revision.
+        if not settings.API_CACHE_REPRESENTATIONS or 'parent' in serializer_class.Meta.fields:
+            return serialize(pages)
+        signature = ':'.join([
+            serializer_class.Meta.model._meta.label, self.action,
+            self.request.GET.get('fields', ''),
+            ','.join(requested_specs(self.request)),
+        ])
+        return cached_representations(self.request, pages, signature, serialize)
+
+    def get_object(self):
+        # get_serializer_class() looks the page up again on every call.
+        if not hasattr(self, '_object'):
+            page = super(PagesAPIEndpoint, self).get_object()
+            model = page.specific_class or type(page)
+            deferred = get_deferred_fields(self.get_serializer_class_for(model))
+            self._object = model._default_manager.defer(*deferred).get(pk=page.pk)
+        return self._object
+
+    def filter_queryset(self, queryset):
+        # get_object() filters the plain pages it looks the page up in.
+        if self.action != 'detail_view':
+            queryset = queryset.defer(
+                *get_deferred_fields(self.get_serializer_class())
+            )
+        return super().filter_queryset(queryset)
+
+    def get_serializer_class(self):
+        # Finding the model costs a query, in get_queryset() or get_object().
+        if not hasattr(self, '_serializer_class'):
+            if self.action != 'detail_view':
+                model = self.get_queryset().model
+            else:
+                model = type(self.get_object())
+            self._serializer_class = self.get_serializer_class_for(model)
+        return self._serializer_class
+
+    def get_serializer_class_for(self, model):
+        """The serializer for ``model`` results, as get_serializer_class()."""
+        fields_config = []
+        if 'fields' in self.request.GET:
+            try:
+                fields_config = parse_fields_parameter(self.request.GET['fields'])
+            except ValueError as e:
+                raise BadRequestError(f'fields error: {e}')
+        return self._get_serializer_class(
+            self.request.wagtailapi_router, model, fields_config,
+            show_details=self.action == 'detail_view'
+        )
+
+    def get_last_modified(self, tokens, pk=None, **kwargs):
+        """
+        A page changes when it's published or something it shows does, a
+        listing when one of its pages does. A page leaving a listing doesn't
+        move its date, the ETag catches that.
+        """
+        if pk is not None:
+            queryset = Page.objects.filter(pk=pk)
+        else:
+            queryset = self.filter_queryset(self.get_queryset())
+            if not isinstance(queryset, QuerySet):
+                # Search results, date them by every page they're from.
+                queryset = self.get_queryset()
+        dates = queryset.aggregate(
+            Max('last_published_at'), Max('latest_revision_created_at')
+        ).values()
+        return max(
+            [date.timestamp() for date in dates if date is not None]
+            + [content_changed_at(tokens)]
+        )
+
+
+class CachedImagesAPIEndpoint(CachedEndpointMixin, ImagesAPIEndpoint):
+    renderer_classes = RENDERER_CLASSES
+    known_query_parameters = ImagesAPIEndpoint.known_query_parameters.union([
+        'renditions',
+    ])
+    # Only shown when asked for with renditions=, in pages too.
+    meta_fields = ImagesAPIEndpoint.meta_fields + ['renditions']
+    listing_default_fields = ImagesAPIEndpoint.listing_default_fields + ['renditions']
+    nested_default_fields = ImagesAPIEndpoint.nested_default_fields + ['renditions']
+
+    @classmethod
+    def get_available_fields(cls, model, db_fields_only=False):
+        fields = super().get_available_fields(model, db_fields_only)
+        if db_fields_only:
+            # Also the rendition rows' relation, but renditions= isn't a filter.
+            fields = [field for field in fields if field != 'renditions']
+        return fields
+
+    @classmethod
+    def get_field_serializer_overrides(cls, model):
+        overrides = super().get_field_serializer_overrides(model)
+        overrides['renditions'] = RenditionsField(read_only=True)
+        return overrides
+
+    def get_serializer(self, instance=None, *args, **kwargs):
+        if kwargs.get('many'):
+            instance = list(instance)
+            instances = instance
+        else:
+            instances = [instance]
+        prefetch_for_serializer(instances, self.get_serializer_class(), self.request)
+        return super().get_serializer(instance, *args, **kwargs)
+
+
+class CachedDocumentsAPIEndpoint(CachedEndpointMixin, DocumentsAPIEndpoint):
+    renderer_classes = RENDERER_CLASSES
 
 
 api_router = WagtailAPIRouter('gensciapi')
 
-api_router.register_endpoint('pages', PagesAPIEndpoint)
-api_router.register_endpoint('images', ImagesAPIEndpoint)
-api_router.register_endpoint('documents', DocumentsAPIEndpoint)
+api_router.register_endpoint('pages', CachedPagesAPIEndpoint)
+api_router.register_endpoint('images', CachedImagesAPIEndpoint)
+api_router.register_endpoint('documents', CachedDocumentsAPIEndpoint)
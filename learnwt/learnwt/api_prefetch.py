@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+API Prefetching
+
+Wagtail's API serialises each result on its own, so every relation a result
+shows (``blog_image``, ``blog_authors`` and their ``author``, ``categories``,
+``carousel_images``) and every page or image a StreamField block refers to is
+loaded with a query per result. prefetch_for_serializer() instead walks the
+serializer built from the ``fields=`` parameter and loads what it is about to
+show across all the results, one query per relation and nesting level:
+
+    prefetch_for_serializer(pages, self.get_serializer_class(), request)
+
+API fields that are properties name the relations they read in the model's
+``api_prefetch``:
+
+    class BlogAuthorsOrderable(Orderable):
+        api_prefetch = {'author_name': ['author']}
+
+and serializer fields that load something per object can do it for all of
+them in a ``prefetch(instances, request)`` method (renditions/api.py).
+
+get_deferred_fields() goes the other way and lists the columns of a page
+type that the serializer won't show, so ``fields=title`` never reads the
+StreamField JSON.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager, prefetch_related_objects
+from modelcluster.fields import ParentalManyToManyField
+from wagtail.core.fields import StreamField
+from wagtail.core.models import Page
+
+from streams.references import resolve_all_references
+
+
+def prefetch_parental_m2m(instances, field):
+    """
+    Load a ParentalManyToManyField of every instance in one query.
+
+    Django can't prefetch these, so the links are handed to the in-memory
+    cluster manager the way a form would.
+    """
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    ordering = field.related_model._meta.ordering
+    related = {instance.pk: [] for instance in instances}
+    links = field.remote_field.through.objects.filter(
+        **{f'{source}__in': related}
+    ).select_related(target).order_by(
+        *[f'{target}__{name}' for name in ordering] or ['pk']
+    )
+    for link in links:
+        related[getattr(link, f'{source}_id')].append(getattr(link, target))
+    for instance in instances:
+        setattr(instance, field.name, related[instance.pk])
+
+
+def get_related(instances, name):
+    """Return the distinct objects the instances refer to through ``name``."""
+    related = {}
+    for instance in instances:
+        value = getattr(instance, name)
+        values = value.all() if isinstance(value, Manager) else [value]
+        for obj in values:
+            if obj is not None:
+                related[id(obj)] = obj
+    return list(related.values())
+
+
+def prefetch_for_serializer(instances, serializer_class, request=None):
+    """Load everything ``serializer_class`` shows of ``instances`` in bulk."""
+    if not instances:
+        return
+    model = serializer_class.Meta.model
+    child_serializer_classes = serializer_class.child_serializer_classes
+    api_prefetch = getattr(model, 'api_prefetch', {})
+    for name in serializer_class.Meta.fields:
+        declared = serializer_class._declared_fields.get(name)
+        if declared is not None:
+            # Shown by the serializer field, not what the model has by the name.
+            if hasattr(declared, 'prefetch'):
+                declared.prefetch(instances, request)
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+
+        if isinstance(field, StreamField):
+            resolve_all_references(
+                [getattr(instance, name) for instance in instances], request
+            )
+        elif field is not None and field.is_relation and name in child_serializer_classes:
+            if isinstance(field, ParentalManyToManyField):
+                prefetch_parental_m2m(instances, field)
+            else:
+                prefetch_related_objects(instances, name)
+            prefetch_for_serializer(
+                get_related(instances, name), child_serializer_classes[name], request
+            )
+        elif name in api_prefetch:
+            prefetch_related_objects(instances, *api_prefetch[name])
+
+
+def get_deferred_fields(serializer_class):
+    """
+    Return the columns added by the serializer's page type that it doesn't
+    show. Page's own columns are small and read by the meta fields, so those
+    are always loaded.
+    """
+    model = serializer_class.Meta.model
+    shown = set(serializer_class.Meta.fields)
+    for name in shown.difference(serializer_class.meta_fields):
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # A property could read any column.
+            return []
+    return [
+        field.name for field in model._meta.concrete_fields
+        if field.model is not Page
+        and not field.primary_key
+        and not (field.remote_field and field.remote_field.parent_link)
+        and field.name not in shown
+    ]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Cursor Pagination
+
+Keyset pagination for listings that get walked deep (blog listing, search).
+
+Django's Paginator runs a COUNT(*) on every request and jumps with OFFSET, so
+page 500 costs far more than page 1. The CursorPaginator instead remembers the
+ordering key of the first and last row it served and asks for the rows just
+after (or before) them, which the database answers straight from the index.
+"""
+import base64
+import datetime
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds DjangoJSONEncoder drops, keys must round-trip."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class CursorPage(Sequence):
+    """A single page of results plus the tokens for its neighbours."""
+
+    # Lets templates tell cursor pages apart from Django's numbered pages.
+    cursor_based = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        self.object_list = list(object_list)
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page of %s items>' % len(self)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by keyset instead of by page number.
+
+    ``ordering`` is a tuple of model fields (prefixed with ``-`` for
+    descending order) that must uniquely identify a row and must not be null,
+    e.g. ``('first_published_at', 'id')``. ``search`` is an optional callable
+    that turns the filtered, ordered queryset into the final results; it is
+    how the search view runs a backend search inside the keyset window.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('id',), search=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.search = search
+
+    def page(self, cursor=None):
+        """Return the page a cursor token points at (the first page if none)."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            return self._page_after(None, has_previous=False)
+
+        values, direction = position
+        if direction == 'previous':
+            return self._page_before(values)
+        return self._page_after(values, has_previous=True)
+
+    def _page_after(self, values, has_previous):
+        rows = self._fetch(values, self.ordering)
+        has_next = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next and rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'previous') if has_previous and rows else None,
+        )
+
+    def _page_before(self, values):
+        reverse_ordering = tuple(
+            field[1:] if field.startswith('-') else '-' + field
+            for field in self.ordering
+        )
+        rows = self._fetch(values, reverse_ordering)
+        has_previous = len(rows) > self.per_page
+        rows = list(reversed(rows[:self.per_page]))
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows else None,
+            previous_cursor=self.encode_cursor(rows[0], 'previous') if has_previous and rows else None,
+        )
+
+    def _fetch(self, values, ordering):
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, ordering))
+        if self.search is not None:
+            queryset = self.search(queryset)
+        # One extra row tells us whether there is anything beyond this page.
+        return list(queryset[:self.per_page + 1])
+
+    @staticmethod
+    def _keyset_filter(values, ordering):
+        """
+        Build ``(a, b) > (x, y)`` as ``a > x OR (a = x AND b > y)``.
+
+        The comparison flips to ``<`` for descending fields.
+        """
+        condition = Q()
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{'%s__%s' % (name, lookup): values[position]})
+            for earlier, earlier_field in enumerate(ordering[:position]):
+                step &= Q(**{earlier_field.lstrip('-'): values[earlier]})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, obj, direction):
+        """Return an opaque, URL safe token pointing next to ``obj``."""
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps([values, direction], cls=CursorEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return ``(values, direction)`` or None for a missing/bad token."""
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values, direction = json.loads(base64.urlsafe_b64decode(padded))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                return None
+            # Tokens come from the query string, anything may be in them.
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            return None
+        if None in values or direction not in ('next', 'previous'):
+            return None
+        return values, direction
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+API Renderers
+
+MessagePack for API clients that ask for it, with ``Accept:
+application/msgpack`` or ``?format=msgpack``. It carries the same data as the
+JSON responses, in fewer bytes and with less encoding work, and needs no
+schema on either side.
+"""
+import msgpack
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Dates, decimals, lazy strings and the like as they are in JSON.
+        return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
@@ -25,14 +25,16 @@ BASE_DIR = os.path.dirname(PROJECT_DIR)
 
 INSTALLED_APPS = [
     'home',
-    'search',
+    'search.apps.SearchConfig',
     'flex',
-    'streams',
+    'streams.apps.StreamsConfig',
     'site_settings',
     'subscribers',
     'blog',
-    'menus',
+    'menus.apps.MenusConfig',
     'contact',
+    'caching.apps.CachingConfig',
+    'renditions.apps.RenditionsConfig',
 
     'materializecssform',
     'materializeform',
@@ -82,6 +84,7 @@ MIDDLEWARE = [
 
     'wagtail.core.middleware.SiteMiddleware',
     'wagtail.contrib.redirects.middleware.RedirectMiddleware',
+    'caching.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'learnwt.urls'
@@ -184,6 +187,52 @@ WAGTAIL_SITE_NAME = "learnwt"
 # e.g. in notification emails. Don't include '/admin' or a trailing slash
 BASE_URL = 'http://example.com'
 
+# Full-text search on an SQLite FTS5 index with BM25 ranking (search/backend.py).
+# Run ``manage.py update_index`` to build the index.
+WAGTAILSEARCH_BACKENDS = {
+    'default': {
+        'BACKEND': 'search.backend',
+    },
+}
+
+# Seconds after which each process rebuilds its autocomplete suggestions to
+# rank them by the latest search hits (search/autocomplete.py).
+AUTOCOMPLETE_REFRESH = 60 * 15
+
+# Seconds saved objects wait before a background thread indexes them, so
+# several saves of a page are indexed once (search/indexing.py). 0 indexes
+# right after the saving transaction commits.
+SEARCH_INDEX_DELAY = 2
+
+# How often, in seconds, the search hits counted in memory are written to the
+# popular query statistics (search/hits.py). 0 writes them on every search.
+SEARCH_HITS_FLUSH_INTERVAL = 10
+
+# Use keyset (cursor) pagination for the blog listing and search results
+# instead of numbered pages, so a deep page costs the same as the first one.
+CURSOR_PAGINATION = False
+
+# How long anonymous page views stay in the page cache (caching/pages.py).
+# Publishing purges them, so this only bounds how long unused entries linger.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# How long API responses stay in the API cache (caching/api.py), which is
+# purged by publishing and content changes just like the page cache.
+API_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Also keep each page's API representation at its live revision, so a
+# response rebuilt after a publish only serialises the pages that changed.
+API_CACHE_REPRESENTATIONS = True
+
+# Generate the renditions of new/changed images right after they're saved
+# (renditions/signals.py). Turn off for bulk imports and run
+# ``manage.py generate_renditions`` afterwards instead.
+PREGENERATE_RENDITIONS = True
+
+# Don't make a page wait for a missing rendition: link to the image serve view
+# and generate it in the background (renditions/pending.py).
+DEFER_RENDITIONS = True
+
 # RECAPTCHA SETTINGS
 RECAPTCHA_PUBLIC_KEY = '6LcTJ7EUAAAAAJe5g803Nne3nu9B7k5XSx3twSNJ'
 RECAPTCHA_PRIVATE_KEY = '6LcTJ7EUAAAAACH5c9a_Hu7lUbHm9MQ-AN6-QpKl'
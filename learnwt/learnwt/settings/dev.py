@@ -28,6 +28,14 @@ INTERNAL_IPS = (
 
 CACHES = {
     'default': {
+        'BACKEND': 'caching.backends.TwoTierCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED_CACHE': 'shared',
+            'CHANNEL': os.path.join(BASE_DIR, 'cache', 'invalidations.sqlite3'),
+        }
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': os.path.join(BASE_DIR, 'cache')
     }
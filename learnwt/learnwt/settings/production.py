@@ -2,6 +2,24 @@ from .base import *
 
 DEBUG = False
 
+# Each worker keeps hot keys in memory (caching/backends.py) and shares the
+# rest through the file cache. Point 'shared' at Redis/Memcached when running
+# on more than one host.
+CACHES = {
+    'default': {
+        'BACKEND': 'caching.backends.TwoTierCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED_CACHE': 'shared',
+            'CHANNEL': os.path.join(BASE_DIR, 'cache', 'invalidations.sqlite3'),
+        }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache')
+    }
+}
+
 try:
     from .local import *
 except ImportError:
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Test Helpers
+
+Settings and content shared by the apps' tests.py modules.
+
+    @test_settings
+    class BlogListingTests(TestCase):
+
+        def setUp(self):
+            self.site = create_site()
+            self.posts = [
+                create_post(self.site.listing, i, self.site.image) for i in range(4)
+            ]
+
+``test_settings`` swaps the shared caches for an in-memory one, keeps uploads
+out of media/ and turns the background threads (search indexing, hit counting,
+rendition generation) into work done right after commit, so tests don't wait
+or race on them. create_site() builds the page tree every site has, a home
+page (and its image) and a blog listing; tests add the posts, images, authors
+and categories they need with create_post() and the models themselves.
+"""
+import atexit
+import json
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import override_settings
+from wagtail.core.models import Collection, Page, Site
+from wagtail.images.models import Image
+from wagtail.images.tests.utils import get_test_image_file
+
+from blog.models import BlogAuthorsOrderable, BlogDetailPage, BlogListingPage
+from home.models import HomePage
+
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='learnwt-tests-')
+atexit.register(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
+test_settings = override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'learnwt-tests',
+        },
+    },
+    MEDIA_ROOT=MEDIA_ROOT,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+    PREGENERATE_RENDITIONS=False,
+    DEFER_RENDITIONS=False,
+    SEARCH_HITS_FLUSH_INTERVAL=0,
+    SEARCH_INDEX_DELAY=0,
+)
+
+
+def create_image(title='Image'):
+    return Image.objects.create(title=title, file=get_test_image_file())
+
+
+def create_site():
+    """
+    Replace the page tree with a published home page and blog listing,
+    returned with the image the home page shows.
+    """
+    cache.clear()
+    if not Collection.objects.exists():
+        # TransactionTestCase flushes the one the migrations made.
+        Collection.add_root(name='Root')
+    Site.objects.all().delete()
+    Page.objects.filter(depth=1).delete()
+    root = Page.add_root(instance=Page(title='Root', slug='root'))
+    image = create_image()
+    home = root.add_child(instance=HomePage(
+        title='Home', slug='home', banner_title='Home',
+        banner_subtitle='<p>Welcome</p>', banner_image=image, sidenav_image=image,
+    ))
+    home.save_revision().publish()
+    site = Site.objects.create(
+        hostname='localhost', port=80, root_page=home, is_default_site=True
+    )
+    listing = home.add_child(instance=BlogListingPage(
+        title='Blog', slug='blog', custom_title='Blog',
+    ))
+    listing.save_revision().publish()
+    return SimpleNamespace(site=site, root=root, home=home, listing=listing, image=image)
+
+
+def create_post(listing, number, image, categories=(), authors=()):
+    """Add a published blog post below ``listing``."""
+    post = BlogDetailPage(
+        title=f'Post {number}', slug=f'post-{number}',
+        custom_title=f'Post {number}', blog_image=image,
+        blog_summary=f'<p>Summary of post {number}</p>',
+        content=json.dumps([
+            {'type': 'full_richtext', 'value': f'<p>Body of post {number}</p>'},
+        ]),
+    )
+    listing.add_child(instance=post)
+    post.categories = list(categories)
+    post.blog_authors = [BlogAuthorsOrderable(author=author) for author in authors]
+    post.save_revision().publish()
+    return post
@@ -0,0 +1,328 @@
+import base64
+import datetime
+import json
+import time
+from unittest import mock
+
+import msgpack
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from wagtail.core.models import PageViewRestriction
+
+from blog.models import BlogAuthor, BlogCategory, BlogDetailPage
+from caching.api import response_key
+
+from .api import CachedPagesAPIEndpoint
+from .api_prefetch import get_deferred_fields, prefetch_for_serializer
+from .pagination import CursorPaginator
+from .testing import create_post, create_site, test_settings
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+@test_settings
+class CursorPaginationTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        for number in range(7):
+            create_post(self.site.listing, number, self.site.image)
+        self.posts = BlogDetailPage.objects.live()
+
+    def walk(self, paginator):
+        """Return the titles on each page, going forward and then back."""
+        forward, backward = [], []
+        page = paginator.page()
+        forward.append([post.title for post in page])
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            forward.append([post.title for post in page])
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward.insert(0, [post.title for post in page])
+        backward.append(forward[-1])
+        return forward, backward
+
+    def test_round_trip(self):
+        forward, backward = self.walk(CursorPaginator(self.posts, 3))
+        self.assertEqual(forward, [
+            ['Post 0', 'Post 1', 'Post 2'],
+            ['Post 3', 'Post 4', 'Post 5'],
+            ['Post 6'],
+        ])
+        self.assertEqual(backward, forward)
+
+    def test_round_trip_on_several_fields(self):
+        paginator = CursorPaginator(
+            self.posts, 2, ordering=('-first_published_at', 'id')
+        )
+        forward, backward = self.walk(paginator)
+        self.assertEqual(forward[0], ['Post 6', 'Post 5'])
+        self.assertEqual(sum(forward, []), ['Post %d' % i for i in range(6, -1, -1)])
+        self.assertEqual(backward, forward)
+
+    def test_invalid_cursors_give_the_first_page(self):
+        paginator = CursorPaginator(self.posts, 3)
+        first_page = [post.title for post in paginator.page()]
+        for cursor in [
+            'not base64!', make_cursor('next'), make_cursor([1, 'next']),
+            make_cursor([['x'], 'next']), make_cursor([[{}], 'next']),
+            make_cursor([[None], 'next']), make_cursor([[1, 2], 'next']),
+            make_cursor([[1], 'sideways']), make_cursor([[1], ['next']]),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+        ]:
+            with self.subTest(cursor=cursor):
+                page = paginator.page(cursor)
+                self.assertEqual([post.title for post in page], first_page)
+                self.assertFalse(page.has_previous())
+
+    def test_cursor_values_are_typed(self):
+        paginator = CursorPaginator(self.posts, 3)
+        values, direction = paginator.decode_cursor(make_cursor([['9'], 'next']))
+        self.assertEqual(values, [9])
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_listing_with_a_bad_cursor(self):
+        response = self.client.get('/blog/', {'cursor': make_cursor([['x'], 'next'])})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Post 0')
+
+
+@test_settings
+class ApiCacheTests(TransactionTestCase):
+
+    listing = '/api/v2/pages/?type=blog.BlogDetailPage&fields=custom_title'
+
+    def setUp(self):
+        self.site = create_site()
+        # Everything the API shows of a post, to be loaded for all of them.
+        categories = [BlogCategory.objects.create(name=f'Category {i}') for i in range(2)]
+        author = BlogAuthor.objects.create(
+            first_name='Author', last_name='Name', image=self.site.image
+        )
+        self.posts = [
+            create_post(self.site.listing, i, self.site.image, categories, [author])
+            for i in range(4)
+        ]
+
+    def titles(self, response):
+        return [item['custom_title'] for item in response.json()['items']]
+
+    def count_queries(self, path):
+        self.client.get(path)  # Generates the renditions.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(path).status_code, 200)
+        return len(queries)
+
+    def test_queries_dont_depend_on_the_number_of_results(self):
+        path = '/api/v2/pages/?type=blog.BlogDetailPage&fields=*&limit='
+        self.assertEqual(self.count_queries(path + '1'), self.count_queries(path + '4'))
+
+    def test_cached_responses_serialise_nothing(self):
+        queries = self.count_queries(self.listing)
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get(self.listing)
+        self.assertEqual(self.titles(response), ['Post 0', 'Post 1', 'Post 2', 'Post 3'])
+        self.assertLess(len(cached), queries)
+        self.assertFalse(any('blog_blogdetailpage' in query['sql'] for query in cached))
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.listing)
+        etag = response['ETag']
+        response = self.client.get(self.listing, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.posts[0].save_revision().publish()
+        response = self.client.get(self.listing, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_outlives_the_cached_response(self):
+        for path in [self.listing, f'/api/v2/pages/{self.posts[0].pk}/']:
+            with self.subTest(path=path):
+                last_modified = self.client.get(path)['Last-Modified']
+                request = RequestFactory().get(path)
+                request.site = self.site.site
+                cache.delete(response_key(request))
+                with mock.patch('time.time', return_value=time.time() + 3600):
+                    response = self.client.get(path, HTTP_IF_MODIFIED_SINCE=last_modified)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['Last-Modified'], last_modified)
+
+    def test_publish_and_unpublish_purge(self):
+        self.client.get(self.listing)
+        post = self.posts[0]
+        post.custom_title = 'Published'
+        post.save_revision().publish()
+        self.posts[1].unpublish()
+        self.assertEqual(
+            self.titles(self.client.get(self.listing)), ['Published', 'Post 2', 'Post 3']
+        )
+
+    def test_view_restrictions_purge(self):
+        self.client.get(self.listing)
+        restriction = PageViewRestriction.objects.create(
+            page=self.posts[0], restriction_type=PageViewRestriction.LOGIN
+        )
+        self.assertEqual(
+            self.titles(self.client.get(self.listing)), ['Post 1', 'Post 2', 'Post 3']
+        )
+        restriction.delete()
+        self.assertEqual(len(self.titles(self.client.get(self.listing))), 4)
+
+
+@test_settings
+class ApiDeferredFieldsTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        cache.clear()
+
+    def page_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [
+            query['sql'] for query in queries
+            if 'FROM "blog_blogdetailpage"' in query['sql']
+        ]
+
+    def serializer_class(self, *fields):
+        class Meta:
+            model = BlogDetailPage
+        Meta.fields = ['id', 'type', 'title'] + list(fields)
+        return type('Serializer', (), {'Meta': Meta, 'meta_fields': ['type']})
+
+    def test_unshown_columns_are_deferred(self):
+        self.assertEqual(
+            sorted(get_deferred_fields(self.serializer_class('custom_title'))),
+            ['blog_image', 'blog_summary', 'content']
+        )
+        self.assertEqual(get_deferred_fields(self.serializer_class(
+            'custom_title', 'blog_summary', 'blog_image', 'content'
+        )), [])
+
+    def test_properties_load_every_column(self):
+        self.assertEqual(get_deferred_fields(self.serializer_class('author_cards')), [])
+
+    def test_listings_skip_the_stream_field(self):
+        path = '/api/v2/pages/?type=blog.BlogDetailPage&fields='
+        queries = self.page_queries(path + 'custom_title')
+        self.assertTrue(queries)
+        for sql in queries:
+            self.assertNotIn('"content"', sql)
+        response = self.client.get(path + 'custom_title')
+        self.assertEqual(response.json()['items'][0]['custom_title'], 'Post 0')
+        self.assertTrue(any('"content"' in sql for sql in self.page_queries(path + 'content')))
+
+    def test_details_skip_the_stream_field(self):
+        path = f'/api/v2/pages/{self.posts[0].pk}/?fields=-content,-blog_summary'
+        queries = self.page_queries(path)
+        self.assertTrue(queries)
+        for sql in queries:
+            self.assertNotIn('"content"', sql)
+        self.assertNotIn('content', self.client.get(path).json())
+
+
+@test_settings
+class ApiExportTests(TestCase):
+
+    path = '/api/v2/pages/export/'
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(4)]
+        # Post 2 changed last.
+        self.posts[2].save_revision().publish()
+
+    def export(self, **params):
+        response = self.client.get(self.path, {'type': 'blog.BlogDetailPage', **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_pages_come_oldest_change_first(self):
+        pages = self.export(fields='*')
+        self.assertEqual(
+            [page['title'] for page in pages], ['Post 0', 'Post 1', 'Post 3', 'Post 2']
+        )
+        self.assertEqual(pages[0]['content'][0]['value'], '<p>Body of post 0</p>')
+        dates = [page['meta']['last_published_at'] for page in pages]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_sync_resumes_from_the_last_page(self):
+        since = self.export()[2]['meta']['last_published_at']
+        self.assertEqual([page['title'] for page in self.export(since=since)], [
+            'Post 3', 'Post 2',
+        ])
+        naive = datetime.datetime(2000, 1, 1).isoformat()
+        self.assertEqual(len(self.export(since=naive)), 4)
+
+    def test_pages_are_serialised_a_chunk_at_a_time(self):
+        with mock.patch.object(CachedPagesAPIEndpoint, 'export_chunk_size', 3), \
+                mock.patch(
+                    'learnwt.api.prefetch_for_serializer', wraps=prefetch_for_serializer
+                ) as prefetch:
+            self.assertEqual(len(self.export(fields='*')), 4)
+        self.assertEqual([len(call[0][0]) for call in prefetch.call_args_list], [3, 1])
+
+    def test_only_live_public_pages(self):
+        self.posts[0].unpublish()
+        PageViewRestriction.objects.create(
+            page=self.posts[1], restriction_type=PageViewRestriction.LOGIN
+        )
+        self.assertEqual([page['title'] for page in self.export()], ['Post 3', 'Post 2'])
+
+    def test_bad_parameters(self):
+        for params in [{'since': 'yesterday'}, {'limit': '10'}, {'fields': 'nope'}]:
+            with self.subTest(params=params):
+                response = self.client.get(
+                    self.path, {'type': 'blog.BlogDetailPage', **params}
+                )
+                self.assertEqual(response.status_code, 400)
+
+
+@test_settings
+class MessagePackTests(TestCase):
+
+    listing = '/api/v2/pages/?type=blog.BlogDetailPage&fields=*'
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+
+    def unpack(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        return msgpack.unpackb(response.content, raw=False)
+
+    def test_same_data_as_json(self):
+        data = self.client.get(self.listing).json()
+        self.assertEqual(self.unpack(self.client.get(self.listing + '&format=msgpack')), data)
+        self.assertEqual(
+            self.unpack(self.client.get(self.listing, HTTP_ACCEPT='application/msgpack')),
+            data
+        )
+        self.assertEqual(self.client.get(self.listing).json(), data)
+
+    def test_details_and_images(self):
+        for path in [
+            f'/api/v2/pages/{self.posts[0].pk}/',
+            f'/api/v2/images/{self.site.image.pk}/',
+        ]:
+            with self.subTest(path=path):
+                data = self.unpack(self.client.get(path, {'format': 'msgpack'}))
+                self.assertEqual(data, self.client.get(path).json())
+
+    def test_errors(self):
+        response = self.client.get('/api/v2/pages/?format=msgpack&limit=x')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), {
+            'message': 'limit must be a positive integer'
+        })
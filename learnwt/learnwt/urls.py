@@ -7,6 +7,7 @@ from wagtail.admin import urls as wagtailadmin_urls
 from wagtail.core import urls as wagtail_urls
 from wagtail.documents import urls as wagtaildocs_urls
 from wagtail.contrib.sitemaps.views import sitemap
+from wagtail.images.views.serve import ServeView
 
 from search import views as search_views
 
@@ -17,8 +18,12 @@ urlpatterns = [
 
     url(r'^admin/', include(wagtailadmin_urls)),
     url(r'^documents/', include(wagtaildocs_urls)),
+    # Renditions that are still being generated link here, see
+    # renditions/pending.py.
+    url(r'^images/([^/]*)/(\d*)/([^/]*)/[^/]*$', ServeView.as_view(action='redirect'), name='wagtailimages_serve'),
 
     url(r'^search/$', search_views.search, name='search'),
+    url(r'^search/autocomplete/$', search_views.autocomplete, name='search_autocomplete'),
 
     url(r'^sitemap.xml$', sitemap),
 
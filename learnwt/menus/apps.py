@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MenusConfig(AppConfig):
     name = 'menus'
+
+    def ready(self):
+        from . import signals  # noqa: F401
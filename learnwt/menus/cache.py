@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Menu Cache
+
+Menus are rendered on every page but only change when an editor touches a
+Menu, one of its items or a page an item links to. We keep each menu fully
+resolved (titles, final URLs, target flags) in worker memory and rebuild it
+only after such a change, so serving a menu costs no database queries.
+
+Workers agree on when to rebuild through a version token kept in the shared
+cache; see menus/signals.py for what bumps it.
+"""
+from collections import namedtuple
+from uuid import uuid4
+
+from django.core.cache import cache
+
+from .models import Menu
+
+
+VERSION_KEY = 'menus_version'
+
+CachedMenu = namedtuple('CachedMenu', ['slug', 'title', 'menu_image', 'items'])
+CachedMenuItem = namedtuple('CachedMenuItem', ['title', 'link', 'open_in_new_tab'])
+
+_menus = {}
+_menus_version = None
+
+
+def get_menu(slug):
+    """Return the resolved menu for ``slug`` or None if there is no such menu."""
+    global _menus_version
+
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First worker up (or the shared cache was flushed): start a new
+        # generation. add() keeps racing workers on the same token.
+        cache.add(VERSION_KEY, uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    if version != _menus_version:
+        _menus.clear()
+        _menus_version = version
+
+    try:
+        return _menus[slug]
+    except KeyError:
+        menu = _menus[slug] = build_menu(slug)
+        return menu
+
+
+def build_menu(slug):
+    """Load a menu with its items and resolve every link in two queries."""
+    menu = Menu.objects.select_related('menu_image').filter(slug=slug).first()
+    if menu is None:
+        return None
+
+    items = menu.menu_items.select_related('link_page')
+    return CachedMenu(
+        slug=menu.slug,
+        title=menu.title,
+        menu_image=menu.menu_image,
+        items=tuple(
+            CachedMenuItem(
+                title=item.title,
+                link=item.link,
+                open_in_new_tab=item.open_in_new_tab
+            )
+            for item in items
+        )
+    )
+
+
+def clear_menus():
+    """Drop the cached menus in every worker."""
+    global _menus_version
+
+    cache.set(VERSION_KEY, uuid4().hex, None)
+    _menus.clear()
+    _menus_version = None
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Menu Fragments
+
+Cached template fragments built from menus (see caching/registry.py).
+"""
+from wagtail.core.models import Page, Site
+from wagtail.images import get_image_model
+
+from caching.registry import Dependency, RENDITION_FIELDS, fragments
+
+from .models import Menu, MenuItem
+
+
+def linked_from_menu(page):
+    """A menu shows the page, or its URL moves with the page."""
+    items = MenuItem.objects.filter(link_page__path__startswith=page.path)
+    return [[]] if items.exists() else []
+
+
+def menu_image(image):
+    return [[]] if Menu.objects.filter(menu_image=image).exists() else []
+
+
+# sidenav.html: {% cache 604800 side_nav %}
+fragments.register(
+    'side_nav',
+    Dependency(Menu),
+    Dependency(MenuItem),
+    Dependency(
+        Page, fields=['title', 'url_path', 'live'], vary_on=linked_from_menu
+    ),
+    Dependency(
+        get_image_model(), fields=RENDITION_FIELDS, vary_on=menu_image
+    ),
+    Dependency(Site),
+)
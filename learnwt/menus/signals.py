@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Menu Signals
+
+Rebuild the cached menus (see menus/cache.py) whenever something they show
+changes: a menu, one of its items, a linked page (or one of its ancestors,
+which moves its URL) or the site configuration.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from wagtail.core.models import Page, Site
+
+from .cache import clear_menus
+from .models import Menu, MenuItem
+
+
+def clear_menus_on_commit():
+    # Other workers must not rebuild from data that isn't committed yet.
+    transaction.on_commit(clear_menus)
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def menu_changed(sender, **kwargs):
+    clear_menus_on_commit()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def page_changed(sender, instance, **kwargs):
+    """Page signals are sent with the specific class, so filter here."""
+    if not isinstance(instance, Page):
+        return
+    linked = MenuItem.objects.filter(link_page__path__startswith=instance.path)
+    if linked.exists():
+        clear_menus_on_commit()
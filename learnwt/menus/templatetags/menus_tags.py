@@ -1,8 +1,8 @@
 from django import template
-from ..models import Menu
+from .. import cache
 
 register = template.Library()
 
 @register.simple_tag()
 def get_menu(slug):
-    return Menu.objects.get(slug=slug)
+    return cache.get_menu(slug)
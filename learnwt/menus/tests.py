@@ -1,3 +1,63 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
-# Create your tests here.
+from learnwt.testing import create_site, test_settings
+
+from . import cache
+from .models import Menu, MenuItem
+
+
+def create_menu(site):
+    menu = Menu.objects.create(title='Main Menu', slug='main-menu')
+    menu.menu_items = [
+        MenuItem(link_page=site.listing),
+        MenuItem(link_url='https://wagtail.io', link_title='Wagtail'),
+    ]
+    menu.save()
+    return menu
+
+
+@test_settings
+class MenuCacheTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        create_menu(self.site)
+        cache.clear_menus()
+
+    def test_menu_is_resolved(self):
+        menu = cache.get_menu('main-menu')
+        self.assertEqual(
+            [(item.title, item.link) for item in menu.items],
+            [('Blog', '/blog/'), ('Wagtail', 'https://wagtail.io')]
+        )
+        self.assertIsNone(cache.get_menu('footer'))
+
+    def test_menu_is_served_from_memory(self):
+        cache.get_menu('main-menu')
+        with self.assertNumQueries(0):
+            cache.get_menu('main-menu')
+
+
+@test_settings
+class MenuInvalidationTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.menu = create_menu(self.site)
+        cache.clear_menus()
+
+    def titles(self):
+        return [item.title for item in cache.get_menu('main-menu').items]
+
+    def test_linked_page_change(self):
+        self.titles()
+        self.site.listing.title = 'News'
+        self.site.listing.save_revision().publish()
+        self.assertEqual(self.titles(), ['News', 'Wagtail'])
+
+    def test_menu_item_change(self):
+        self.titles()
+        item = self.menu.menu_items.get(link_title='Wagtail')
+        item.link_title = 'Wagtail CMS'
+        item.save()
+        self.assertEqual(self.titles(), ['Blog', 'Wagtail CMS'])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Renditions in the API
+
+API clients ask for the renditions they show images with alongside the
+images, instead of an extra request per image:
+
+    /api/v2/pages/?type=home.HomePage&fields=banner_image&renditions=fill-400x200
+
+Each image in the response, nested in a page or not, then has its URL, width
+and height per spec under ``meta.renditions``. Only specs the site uses
+itself (renditions/specs.py) can be asked for, so clients can't fill the
+media directory with sizes nobody else needs.
+
+The renditions of all the images in a response are loaded in one query
+(prefetch_renditions(), from learnwt/api_prefetch.py). Missing ones are
+generated in the background and linked to the image serve view meanwhile,
+as on pages (renditions/pending.py); such responses aren't cached.
+"""
+from rest_framework.fields import Field, SkipField
+from wagtail.api.v2.utils import BadRequestError
+
+from caching import api
+
+from .pending import PendingRendition
+from .prefetch import get_rendition, prefetch_renditions
+from .specs import all_specs
+
+
+def requested_specs(request):
+    """Return the specs in the ``renditions`` parameter, checked."""
+    specs = [spec for spec in request.GET.get('renditions', '').split(',') if spec]
+    unknown = set(specs).difference(all_specs())
+    if unknown:
+        raise BadRequestError(
+            "unknown renditions: %s (the site uses %s)"
+            % (', '.join(sorted(unknown)), ', '.join(all_specs()))
+        )
+    return specs
+
+
+class RenditionsField(Field):
+    """
+    Serializes the renditions asked for of an image.
+
+    Example:
+    "renditions": {
+        "fill-400x200": {"url": "/media/images/a.fill-400x200.jpg", "width": 400, "height": 200}
+    }
+    """
+
+    def get_attribute(self, instance):
+        if not requested_specs(self.context['request']):
+            raise SkipField
+        return instance
+
+    def to_representation(self, image):
+        request = self.context['request']
+        renditions = {}
+        prefetched = getattr(image, 'prefetched_renditions', {})
+        for spec in requested_specs(request):
+            # A pending one was queued by prefetch() just now, keep it.
+            rendition = prefetched.get(spec) or get_rendition(image, spec)
+            if isinstance(rendition, PendingRendition):
+                # Cache the response once it can link to the finished file.
+                api.skip_response(request)
+            renditions[spec] = {
+                'url': rendition.url,
+                'width': rendition.width,
+                'height': rendition.height,
+            }
+        return renditions
+
+    def prefetch(self, images, request):
+        """Load the renditions of ``images`` in one query, for prefetch_for_serializer()."""
+        specs = requested_specs(request)
+        if specs:
+            prefetch_renditions(images, *specs)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class RenditionsConfig(AppConfig):
+    name = 'renditions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Rendition Generation
+
+Create the renditions images will be shown with before anyone asks for them,
+so no visitor waits for an original to be decoded and resized.
+
+Only missing renditions are generated, which makes every run idempotent: an
+interrupted run picks up where it stopped.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+
+from django.db import IntegrityError, connection
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter, SourceImageIOError
+
+
+logger = getLogger(__name__)
+
+# One thread is enough: it only catches up on new images and must not
+# compete with requests for CPU.
+executor = ThreadPoolExecutor(max_workers=1)
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def missing_specs(images, specs):
+    """
+    Return ``{image id: [spec, ...]}`` for the renditions ``images`` lack.
+
+    The rendition of an image depends on its focal point, so existing
+    renditions are matched on the focal point key like get_rendition() does.
+    """
+    images = list(images)
+    if not images or not specs:
+        return {}
+    Rendition = get_image_model().get_rendition_model()
+    existing = set(
+        Rendition.objects
+        .filter(image__in=images, filter_spec__in=specs)
+        .values_list('image_id', 'filter_spec', 'focal_point_key')
+    )
+    filters = [Filter(spec=spec) for spec in specs]
+    missing = {}
+    for image in images:
+        for image_filter in filters:
+            key = (image.pk, image_filter.spec, image_filter.get_cache_key(image))
+            if key not in existing:
+                missing.setdefault(image.pk, []).append(image_filter.spec)
+    return missing
+
+
+def generate_renditions(image_id, specs):
+    """
+    Create the ``specs`` renditions of one image.
+
+    Returns ``(image id, renditions created, seconds taken, error)``. Runs in
+    worker processes, so it only takes and returns plain values.
+    """
+    started = time.time()
+    created = 0
+    try:
+        image = get_image_model().objects.get(pk=image_id)
+        for spec in specs:
+            try:
+                image.get_rendition(spec)
+            except IntegrityError:
+                # Someone rendered it at the same time.
+                continue
+            created += 1
+    except (get_image_model().DoesNotExist, SourceImageIOError, OSError) as error:
+        logger.warning(f'Could not generate renditions of image {image_id}: {error}')
+        return image_id, created, time.time() - started, str(error)
+    return image_id, created, time.time() - started, None
+
+
+def generate_missing(image_ids, specs):
+    """Create whatever renditions of these images are missing, in-process."""
+    images = get_image_model().objects.filter(pk__in=image_ids)
+    return [
+        generate_renditions(image_id, image_specs)
+        for image_id, image_specs in missing_specs(images, specs).items()
+    ]
+
+
+def generate_in_background(image_id, specs):
+    """Queue generate_missing() for one image, unless it's queued already."""
+    job = (image_id, tuple(specs))
+    with _queued_lock:
+        if job in _queued:
+            return
+        _queued.add(job)
+
+    def run():
+        try:
+            generate_missing([image_id], specs)
+        finally:
+            with _queued_lock:
+                _queued.discard(job)
+            connection.close()
+
+    executor.submit(run)
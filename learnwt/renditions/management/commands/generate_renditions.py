@@ -0,0 +1,97 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from wagtail.images import get_image_model
+
+from renditions.generate import generate_renditions, missing_specs
+from renditions.specs import all_specs
+from renditions.workers import setup_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the missing renditions of every image for every filter spec "
+        "used by the templates and code. Safe to interrupt and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help="Number of processes resizing images (default: one per CPU).",
+        )
+        parser.add_argument(
+            '--spec', action='append', dest='specs',
+            help="Only generate this filter spec, may be repeated.",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help="Images checked for missing renditions per query.",
+        )
+        parser.add_argument(
+            '--list-specs', action='store_true',
+            help="Print the filter specs that would be generated and exit.",
+        )
+
+    def handle(self, *args, **options):
+        specs = options['specs'] or all_specs()
+        if options['list_specs']:
+            for spec in specs:
+                self.stdout.write(spec)
+            return
+
+        self.stdout.write(f"Filter specs: {', '.join(specs)}")
+        missing = self.find_missing(specs, options['batch_size'])
+        total = sum(len(image_specs) for image_specs in missing.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS("All renditions exist."))
+            return
+        self.stdout.write(f"{total} renditions missing across {len(missing)} images.")
+
+        started = time.time()
+        created = failed = done = 0
+        for image_id, count, seconds, error in self.run(missing, options['workers']):
+            done += 1
+            created += count
+            if error:
+                failed += 1
+                self.stderr.write(f"Image {image_id}: {error}")
+            elif options['verbosity'] > 1:
+                self.stdout.write(f"Image {image_id}: {count} renditions in {seconds:.2f}s")
+            if done % 25 == 0 or done == len(missing):
+                elapsed = time.time() - started
+                self.stdout.write(
+                    f"[{done}/{len(missing)} images] {created} renditions, "
+                    f"{elapsed:.1f}s, {created / elapsed:.1f}/s"
+                )
+
+        message = f"Generated {created} renditions in {time.time() - started:.1f}s."
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{message} {failed} images failed."))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
+
+    def find_missing(self, specs, batch_size):
+        missing = {}
+        images = get_image_model().objects.order_by('pk')
+        for start in range(0, images.count(), batch_size):
+            missing.update(missing_specs(images[start:start + batch_size], specs))
+        return missing
+
+    def run(self, missing, workers):
+        if workers <= 1:
+            for image_id, specs in missing.items():
+                yield generate_renditions(image_id, specs)
+            return
+
+        # Forked workers must open their own database connections.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as executor:
+            futures = [
+                executor.submit(generate_renditions, image_id, specs)
+                for image_id, specs in missing.items()
+            ]
+            for future in as_completed(futures):
+                yield future.result()
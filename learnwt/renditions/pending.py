@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Pending Renditions
+
+With ``settings.DEFER_RENDITIONS`` on, a missing rendition doesn't hold up the
+page: it's queued for the background worker and the page links to Wagtail's
+image serve view instead, which redirects to the finished file (or renders it
+then, if the worker hasn't got to it yet). Only the browser's image request
+can wait on a resize, never the page itself.
+
+Width and height are worked out by running the filter's operations on a
+stand-in that only tracks the image size, so layout doesn't shift once the
+real file arrives.
+"""
+from collections import OrderedDict
+
+from django.forms.utils import flatatt
+from django.utils.safestring import mark_safe
+
+from .generate import generate_in_background
+
+
+class ImageSize:
+    """The part of the Willow API filter operations use, on sizes only."""
+
+    def __init__(self, width, height):
+        self.size = (width, height)
+
+    def get_size(self):
+        return self.size
+
+    def crop(self, rect):
+        return ImageSize(rect.width, rect.height)
+
+    def resize(self, size):
+        return ImageSize(*size)
+
+    def auto_orient(self):
+        return self
+
+    def has_alpha(self):
+        return False
+
+    def set_background_color_rgb(self, color):
+        return self
+
+
+def rendition_size(image, image_filter):
+    size = ImageSize(image.width, image.height)
+    for operation in image_filter.operations:
+        size = operation.run(size, image, {}) or size
+    return size.get_size()
+
+
+class PendingRendition:
+    """Stands in for a rendition the background worker is generating."""
+
+    def __init__(self, image, image_filter):
+        self.image = image
+        self.filter_spec = image_filter.spec
+        self.width, self.height = rendition_size(image, image_filter)
+
+    @property
+    def url(self):
+        # The serve view module needs the models, which import this module.
+        from wagtail.images.views.serve import generate_image_url
+        return generate_image_url(self.image, self.filter_spec)
+
+    @property
+    def alt(self):
+        return self.image.title
+
+    @property
+    def attrs(self):
+        return flatatt(self.attrs_dict)
+
+    @property
+    def attrs_dict(self):
+        return OrderedDict([
+            ('src', self.url),
+            ('width', self.width),
+            ('height', self.height),
+            ('alt', self.alt),
+        ])
+
+    def img_tag(self, extra_attributes={}):
+        attrs = self.attrs_dict.copy()
+        attrs.update(extra_attributes)
+        return mark_safe('<img{}>'.format(flatatt(attrs)))
+
+    def __html__(self):
+        return self.img_tag()
+
+
+def defer_rendition(image, image_filter):
+    """Queue a missing rendition and return a PendingRendition for it."""
+    generate_in_background(image.pk, [image_filter.spec])
+    return PendingRendition(image, image_filter)
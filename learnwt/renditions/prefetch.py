@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Rendition Prefetching
+
+Load the renditions a loop of images is shown with in one query instead of
+one per ``{% image %}`` tag:
+
+    def get_context(self, request):
+        context = super().get_context(request)
+        prefetch_renditions([card.image for card in cards], 'fill-300x300')
+        return context
+
+The renditions are attached to the image instances, where get_rendition()
+below and the ``{% image %}`` tag from ``rendition_tags`` pick them up. Missing
+renditions are created as usual, or queued (see renditions/pending.py).
+"""
+from django.conf import settings
+from wagtail.images import get_image_model
+from wagtail.images.models import Filter
+from wagtail.images.shortcuts import get_rendition_or_not_found
+
+from .pending import PendingRendition, defer_rendition
+
+
+def prefetch_renditions(images, *specs):
+    """
+    Attach the ``specs`` renditions of ``images`` using a single query.
+
+    ``images`` may contain None and the same image more than once.
+    """
+    images = [image for image in images if image is not None]
+    Rendition = get_image_model().get_rendition_model()
+    # Skip images that have them already, e.g. from streams/references.py.
+    wanted = [
+        image for image in images
+        if not all(
+            isinstance(image.__dict__.get('prefetched_renditions', {}).get(spec), Rendition)
+            for spec in specs
+        )
+    ]
+    if not wanted or not specs:
+        return images
+
+    filters = [Filter(spec=spec) for spec in specs]
+    renditions = Rendition.objects.filter(
+        image_id__in={image.pk for image in wanted},
+        filter_spec__in=[image_filter.spec for image_filter in filters],
+    )
+    found = {
+        (rendition.image_id, rendition.filter_spec, rendition.focal_point_key): rendition
+        for rendition in renditions
+    }
+
+    for image in wanted:
+        prefetched = image.__dict__.setdefault('prefetched_renditions', {})
+        for image_filter in filters:
+            key = (image.pk, image_filter.spec, image_filter.get_cache_key(image))
+            rendition = found.get(key)
+            if rendition is None:
+                # Not generated yet, see renditions/generate.py.
+                rendition = missing_rendition(image, image_filter)
+            # Saves a query for rendition.alt, which reads the image title.
+            rendition.image = image
+            prefetched[image_filter.spec] = rendition
+    return images
+
+
+def missing_rendition(image, image_filter):
+    """Create a rendition now or, with DEFER_RENDITIONS, in the background."""
+    if settings.DEFER_RENDITIONS:
+        return defer_rendition(image, image_filter)
+    return get_rendition_or_not_found(image, image_filter)
+
+
+def get_rendition(image, image_filter):
+    """Return a prefetched rendition or fetch/create it like the image tag."""
+    spec = image_filter.spec if isinstance(image_filter, Filter) else image_filter
+    rendition = getattr(image, 'prefetched_renditions', {}).get(spec)
+    # Images may outlive a request (see menus/cache.py), so look for the
+    # finished file again rather than keep linking to a pending one.
+    if rendition is None or isinstance(rendition, PendingRendition):
+        prefetch_renditions([image], spec)
+    return image.prefetched_renditions[spec]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Rendition Signals
+
+Generate an image's renditions in the background as soon as it's uploaded or
+its file or focal point changes, instead of on its first page view.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from wagtail.images import get_image_model
+
+from .generate import generate_in_background
+from .specs import all_specs
+
+
+@receiver(post_save, sender=get_image_model())
+def image_saved(sender, instance, **kwargs):
+    if not settings.PREGENERATE_RENDITIONS:
+        return
+    transaction.on_commit(
+        lambda: generate_in_background(instance.pk, all_specs())
+    )
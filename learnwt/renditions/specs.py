@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Rendition Specs
+
+Find the filter specs the site renders images with, so their renditions can
+be generated ahead of the first visitor (see renditions/generate.py).
+
+Specs used in ``{% image %}`` tags are read from the templates; specs used
+from Python code are registered where they are defined:
+
+    register_spec(BlogListingPage.listing_image_spec)
+"""
+import os
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import engines
+from django.utils.text import smart_split
+
+
+IMAGE_TAG = re.compile(r'{%\s*image\s+(.*?)\s*%}')
+
+_registered = set()
+
+
+def register_spec(spec):
+    """Declare a filter spec used outside of templates."""
+    _registered.add(spec)
+    return spec
+
+
+def parse_image_tag(arguments):
+    """Return the filter spec of ``{% image %}`` tag arguments, like the tag does."""
+    bits = list(smart_split(arguments))[1:]
+    filter_specs = []
+    for bit in bits:
+        if bit == 'as':
+            break
+        if '=' not in bit:
+            filter_specs.append(bit)
+    return '|'.join(filter_specs)
+
+
+def template_files():
+    """Our own templates; Wagtail's admin thumbnails aren't worth generating."""
+    for engine in engines.all():
+        for directory in getattr(engine, 'template_dirs', []):
+            directory = str(directory)
+            if not directory.startswith(settings.BASE_DIR) or 'site-packages' in directory:
+                continue
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if name.endswith(('.html', '.txt')):
+                        yield os.path.join(root, name)
+
+
+@lru_cache()
+def template_specs():
+    specs = set()
+    for path in template_files():
+        with open(path, encoding='utf-8') as template:
+            for arguments in IMAGE_TAG.findall(template.read()):
+                spec = parse_image_tag(arguments)
+                if spec:
+                    specs.add(spec)
+    return frozenset(specs)
+
+
+def all_specs():
+    """Every filter spec used by templates and code, sorted."""
+    return sorted(template_specs() | _registered)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Rendition Tags
+
+A drop-in ``{% image %}`` tag that uses renditions attached by
+renditions.prefetch.prefetch_renditions() before querying for them. Load it
+after ``wagtailimages_tags`` to replace Wagtail's tag:
+
+    {% load wagtailimages_tags rendition_tags %}
+"""
+from django import template
+from wagtail.images.templatetags.wagtailimages_tags import ImageNode
+from wagtail.images.templatetags.wagtailimages_tags import image as parse_image
+
+from caching import pages
+
+from ..pending import PendingRendition
+from ..prefetch import get_rendition
+
+
+register = template.Library()
+
+
+class PrefetchedImageNode(ImageNode):
+
+    def render(self, context):
+        try:
+            image = self.image_expr.resolve(context)
+        except template.VariableDoesNotExist:
+            return ''
+
+        if not image:
+            return ''
+
+        if not hasattr(image, 'get_rendition'):
+            raise ValueError("image tag expected an Image object, got %r" % image)
+
+        rendition = get_rendition(image, self.filter)
+        if isinstance(rendition, PendingRendition):
+            # Cache the page once it can link to the finished file.
+            pages.skip_response(context.get('request'))
+
+        if self.output_var_name:
+            context[self.output_var_name] = rendition
+            return ''
+        resolved_attrs = {
+            key: value.resolve(context) for key, value in self.attrs.items()
+        }
+        return rendition.img_tag(resolved_attrs)
+
+
+@register.tag(name='image')
+def image(parser, token):
+    node = parse_image(parser, token)
+    return PrefetchedImageNode(
+        node.image_expr, node.filter_spec, output_var_name=node.output_var_name,
+        attrs=node.attrs,
+    )
@@ -0,0 +1,219 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from learnwt.testing import create_image, create_post, create_site, test_settings
+
+from .pending import PendingRendition
+from .prefetch import get_rendition, prefetch_renditions
+from .specs import all_specs
+
+
+@test_settings
+class PrefetchRenditionsTests(TestCase):
+
+    specs = ('fill-50x50', 'fill-400x200')
+
+    def setUp(self):
+        self.images = [create_image(f'Image {i}') for i in range(3)]
+        for image in self.images:
+            for spec in self.specs:
+                image.get_rendition(spec)
+
+    def fresh_images(self):
+        return [type(image).objects.get(pk=image.pk) for image in self.images]
+
+    def test_one_query_for_every_image_and_spec(self):
+        images = self.fresh_images()
+        with self.assertNumQueries(1):
+            prefetch_renditions(images + [None, images[0]], *self.specs)
+        with self.assertNumQueries(0):
+            for image in images:
+                for spec in self.specs:
+                    rendition = get_rendition(image, spec)
+                    self.assertEqual(rendition.filter_spec, spec)
+                    self.assertEqual(rendition.alt, image.title)
+
+    def test_image_tag_uses_prefetched_renditions(self):
+        images = prefetch_renditions(self.fresh_images(), 'fill-50x50')
+        template = Template(
+            '{% load wagtailimages_tags rendition_tags %}'
+            '{% for image in images %}{% image image fill-50x50 class="thumb" %}{% endfor %}'
+        )
+        with self.assertNumQueries(0):
+            html = template.render(Context({'images': images}))
+        self.assertEqual(html.count('class="thumb"'), 3)
+        self.assertEqual(html.count('width="50"'), 3)
+
+    def test_prefetched_images_are_skipped(self):
+        images = prefetch_renditions(self.fresh_images(), *self.specs)
+        with self.assertNumQueries(0):
+            prefetch_renditions(images, *self.specs)
+
+    def test_missing_renditions_are_created(self):
+        image = create_image('New')
+        prefetch_renditions([image], 'fill-80x80')
+        rendition = get_rendition(image, 'fill-80x80')
+        self.assertEqual((rendition.width, rendition.height), (80, 80))
+        self.assertTrue(image.renditions.filter(filter_spec='fill-80x80').exists())
+
+
+@test_settings
+class GenerateRenditionsTests(TestCase):
+
+    def setUp(self):
+        self.images = [create_image(f'Image {i}') for i in range(3)]
+
+    def generate(self, *args):
+        out = StringIO()
+        call_command('generate_renditions', '--workers=1', *args, stdout=out, stderr=out)
+        return out.getvalue()
+
+    def test_lists_the_site_specs(self):
+        self.assertEqual(self.generate('--list-specs').split(), all_specs())
+        self.assertIn('fill-300x300', all_specs())
+
+    def test_only_missing_renditions_are_generated(self):
+        self.images[0].get_rendition('fill-50x50')
+        output = self.generate('--spec=fill-50x50', '--spec=fill-400x200', '--batch-size=2')
+        self.assertIn('5 renditions missing across 3 images.', output)
+        self.assertIn('Generated 5 renditions', output)
+        for image in self.images:
+            self.assertEqual(
+                sorted(image.renditions.values_list('filter_spec', flat=True)),
+                ['fill-400x200', 'fill-50x50']
+            )
+        self.assertIn('All renditions exist.', self.generate('--spec=fill-50x50'))
+
+
+@override_settings(DEFER_RENDITIONS=True)
+@test_settings
+class PendingRenditionTests(TestCase):
+
+    def setUp(self):
+        self.image = create_image()
+        patcher = mock.patch('renditions.pending.generate_in_background')
+        self.generate_in_background = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing_renditions_are_queued(self):
+        rendition = get_rendition(self.image, 'fill-400x200')
+        self.assertIsInstance(rendition, PendingRendition)
+        self.generate_in_background.assert_called_once_with(self.image.pk, ['fill-400x200'])
+        self.assertFalse(self.image.renditions.exists())
+
+    def test_pending_renditions_have_the_final_size(self):
+        for spec, size in [
+            ('fill-400x200', (400, 200)), ('max-320x320', (320, 240)),
+            ('width-100', (100, 75)), ('original', (640, 480)),
+        ]:
+            with self.subTest(spec=spec):
+                pending = get_rendition(self.image, spec)
+                self.assertEqual((pending.width, pending.height), size)
+                generated = self.image.get_rendition(spec)
+                self.assertEqual((generated.width, generated.height), size)
+
+    def test_pending_renditions_link_to_the_serve_view(self):
+        pending = get_rendition(self.image, 'fill-400x200')
+        response = self.client.get(pending.url)
+        self.assertEqual(response.status_code, 301)
+        rendition = self.image.renditions.get(filter_spec='fill-400x200')
+        self.assertEqual(response['Location'], rendition.url)
+
+    def test_pages_showing_them_stay_out_of_the_page_cache(self):
+        request = RequestFactory().get('/')
+        request.page_cache_tokens = (1, 'generation', 'version')
+        html = Template(
+            '{% load wagtailimages_tags rendition_tags %}{% image image fill-400x200 %}'
+        ).render(Context({'image': self.image, 'request': request}))
+        self.assertIn('width="400"', html)
+        self.assertIsNone(request.page_cache_tokens)
+
+    def test_finished_renditions_replace_pending_ones(self):
+        pending = get_rendition(self.image, 'fill-400x200')
+        self.image.get_rendition('fill-400x200')
+        rendition = get_rendition(self.image, 'fill-400x200')
+        self.assertNotIsInstance(rendition, PendingRendition)
+        self.assertNotEqual(rendition.url, pending.url)
+
+
+@test_settings
+class ApiRenditionsTests(TestCase):
+
+    listing = '/api/v2/pages/'
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        self.rendition = self.site.image.get_rendition('fill-400x200')
+
+    def get(self, path, **params):
+        if path == self.listing:
+            params.update(type='blog.BlogDetailPage', fields='blog_image')
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_nested_images_show_their_renditions(self):
+        items = self.get(self.listing, renditions='fill-400x200,fill-50x50')['items']
+        renditions = items[0]['blog_image']['meta']['renditions']
+        self.assertEqual(renditions['fill-400x200'], {
+            'url': self.rendition.url, 'width': 400, 'height': 200,
+        })
+        self.assertEqual(
+            (renditions['fill-50x50']['width'], renditions['fill-50x50']['height']), (50, 50)
+        )
+        self.assertEqual(items[1]['blog_image'], items[0]['blog_image'])
+
+    def test_images_endpoint(self):
+        image = self.get('/api/v2/images/', renditions='fill-400x200')['items'][0]
+        self.assertEqual(image['meta']['renditions']['fill-400x200']['url'], self.rendition.url)
+        detail = self.get(f'/api/v2/images/{self.site.image.pk}/', renditions='fill-400x200')
+        self.assertEqual(detail['meta']['renditions'], image['meta']['renditions'])
+
+    def test_only_shown_when_asked_for(self):
+        image = self.get(self.listing)['items'][0]['blog_image']
+        self.assertNotIn('renditions', image['meta'])
+
+    def test_unknown_specs_are_refused(self):
+        response = self.client.get(self.listing, {
+            'type': 'blog.BlogDetailPage', 'fields': 'blog_image',
+            'renditions': 'fill-4000x4000',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fill-4000x4000', response.json()['message'])
+
+    def test_renditions_are_loaded_in_one_query(self):
+        def count_queries(renditions):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.get(self.listing, renditions=renditions)
+            return len(queries)
+
+        self.site.image.get_rendition('fill-50x50')
+        other = create_image('Other')
+        for spec in ('fill-400x200', 'fill-50x50'):
+            other.get_rendition(spec)
+        self.posts[1].blog_image = other
+        self.posts[1].save_revision().publish()
+        self.assertEqual(
+            count_queries('fill-400x200,fill-50x50'), count_queries('') + 1
+        )
+
+    @override_settings(DEFER_RENDITIONS=True)
+    def test_responses_with_pending_renditions_arent_cached(self):
+        def url():
+            image = self.get(self.listing, renditions='fill-300x300')['items'][0]['blog_image']
+            return image['meta']['renditions']['fill-300x300']['url']
+
+        with mock.patch('renditions.pending.generate_in_background'):
+            pending = url()
+            rendition = self.site.image.get_rendition('fill-300x300')
+            self.assertNotEqual(pending, rendition.url)
+            self.assertEqual(url(), rendition.url)
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+Worker Processes
+
+Set up the processes generate_renditions hands images to. Forked workers
+inherit a ready Django; spawned ones (the default on macOS and Windows) start
+a fresh interpreter and must set it up before the first task is unpickled,
+which is why nothing here imports models.
+"""
+import django
+from django.apps import apps
+
+
+def setup_worker():
+    """ProcessPoolExecutor initializer, runs once in every worker."""
+    if not apps.ready:
+        django.setup()
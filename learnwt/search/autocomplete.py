@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Search Autocomplete
+
+Suggestions for a search-as-you-type box, without a backend search per
+keystroke. Each process keeps every page title, blog post custom title,
+category name and author name in memory, as a sorted array of
+``(word, -popularity, text, kind, pk)`` rows, one per word of the text, so
+the suggestions for a prefix are a bisect and a short scan:
+
+    suggest('quok ru')  # -> [Suggestion('Quokkas running wild', ...), ...]
+
+A suggestion's popularity is how many recorded searches (Query hits) it
+would have matched. search/signals.py refreshes the entries of a page when it
+is published, unpublished, deleted or its view restrictions change and of a
+category or author when it is saved or deleted.
+
+A refresh loads the new entries once and adds them to a numbered log of
+changes in the cache. Every process applies the changes it hasn't seen
+before answering, a dictionary update per change. Only a process that lost
+track of the log (changes evicted, or more than MAX_CHANGES behind) loads
+everything again, in a background thread while it answers from what it has,
+as every process does after ``settings.AUTOCOMPLETE_REFRESH`` seconds to pick
+up new hits. Only the first suggestions of a process wait for a full load.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from wagtail.core.models import Page
+from wagtail.search.models import Query
+
+from blog.models import BlogAuthor, BlogCategory, BlogDetailPage
+
+
+SEQUENCE_KEY = 'search_autocomplete:sequence'
+# A process further behind than this loads everything instead.
+MAX_CHANGES = 100
+# Only the most searched queries count towards popularity.
+POPULAR_QUERIES = 1000
+WORD_RE = re.compile(r'\w+')
+
+Suggestion = namedtuple('Suggestion', ['text', 'kind', 'url', 'popularity'])
+
+
+def get_words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def matches(words, terms):
+    """Whether every term is the start of one of the words."""
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
+
+class PrefixIndex:
+    """The suggestions of one process, see the module docstring."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+        # (kind, pk) -> {text: Suggestion}
+        self.suggestions = {}
+        self.popular = []
+        # The last change of the log this index holds.
+        self.sequence = None
+        self.built_at = None
+        self.rebuilding = None
+
+    def popularity(self, text):
+        words = get_words(text)
+        return sum(
+            hits for terms, hits in self.popular if matches(words, terms)
+        )
+
+    def build(self, sequence):
+        """Load every suggestion again, and the popular queries."""
+        popular = [
+            (get_words(query_string), hits) for query_string, hits in
+            Query.get_most_popular().values_list(
+                'query_string', '_hits'
+            )[:POPULAR_QUERIES]
+        ]
+        entries = load_pages(Page.objects.all())
+        entries.update(load_categories(BlogCategory.objects.all()))
+        entries.update(load_authors(BlogAuthor.objects.all()))
+        with self.lock:
+            self.rows = []
+            self.suggestions = {}
+            self.popular = popular
+            for key, texts in entries.items():
+                self._set(key, texts, sort=False)
+            self.rows.sort()
+            # Changes logged while loading are applied again, which is harmless.
+            self.sequence = sequence
+            self.built_at = time.monotonic()
+
+    def catch_up(self, sequence):
+        """
+        Apply the logged changes up to ``sequence``. Returns False if some
+        are gone from the cache, the index must be rebuilt then.
+        """
+        with self.lock:
+            if sequence <= self.sequence:
+                return True
+            keys = [change_key(number) for number in range(self.sequence + 1, sequence + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) < len(keys):
+                return False
+            for key in keys:
+                for entry_key, texts in changes[key].items():
+                    self._set(entry_key, texts)
+            self.sequence = sequence
+        return True
+
+    def _set(self, key, texts, sort=True):
+        kind, pk = key
+        for suggestion in self.suggestions.pop(key, {}).values():
+            for word in set(get_words(suggestion.text)):
+                row = (word, -suggestion.popularity, suggestion.text, kind, pk)
+                i = bisect_left(self.rows, row)
+                if i < len(self.rows) and self.rows[i] == row:
+                    del self.rows[i]
+        if not texts:
+            return
+        self.suggestions[key] = {}
+        for text, url in texts.items():
+            suggestion = Suggestion(text, kind, url, self.popularity(text))
+            self.suggestions[key][text] = suggestion
+            for word in set(get_words(text)):
+                row = (word, -suggestion.popularity, text, kind, pk)
+                if sort:
+                    insort(self.rows, row)
+                else:
+                    self.rows.append(row)
+
+    def suggest(self, query_string, limit):
+        terms = get_words(query_string)
+        if not terms:
+            return []
+        *words, prefix = terms
+        with self.lock:
+            candidates = {}
+            i = bisect_left(self.rows, (prefix, ))
+            while i < len(self.rows) and self.rows[i][0].startswith(prefix):
+                word, popularity, text, kind, pk = self.rows[i]
+                candidates[(text, kind, pk)] = popularity
+                i += 1
+            best = heapq.nsmallest(
+                limit,
+                (
+                    (popularity, text, kind, pk)
+                    for (text, kind, pk), popularity in candidates.items()
+                    if matches(get_words(text), words)
+                )
+            )
+            return [
+                self.suggestions[(kind, pk)][text]
+                for popularity, text, kind, pk in best
+            ]
+
+
+_index = PrefixIndex()
+
+
+def load_pages(pages):
+    """Return the suggestions for the live, public pages among ``pages``."""
+    pages = pages.live().public().filter(depth__gt=1)
+    entries = {('page', page.pk): {page.title: page.get_url()} for page in pages}
+    custom_titles = BlogDetailPage.objects.filter(
+        pk__in=[pk for kind, pk in entries]
+    ).values_list('pk', 'custom_title')
+    for pk, custom_title in custom_titles:
+        texts = entries[('page', pk)]
+        if custom_title:
+            texts[custom_title] = next(iter(texts.values()))
+    return entries
+
+
+def load_categories(categories):
+    return {
+        ('category', pk): {name: None}
+        for pk, name in categories.values_list('pk', 'name')
+    }
+
+
+def load_authors(authors):
+    return {
+        ('author', author.pk): {author.name(): None}
+        for author in authors.only('first_name', 'last_name')
+    }
+
+
+def change_key(sequence):
+    return f'search_autocomplete:change:{sequence}'
+
+
+def get_sequence():
+    """Return the number of the latest change, starting the log if need be."""
+    # Started from the time, so a log evicted and started again is ahead of
+    # every process and none of them mistakes new changes for ones it has.
+    cache.add(SEQUENCE_KEY, int(time.time() * 1000), None)
+    return cache.get(SEQUENCE_KEY)
+
+
+def rebuild():
+    try:
+        _index.build(get_sequence())
+    finally:
+        _index.rebuilding = None
+        connection.close()
+
+
+def rebuild_later():
+    """Rebuild the index in a thread, the old one answers until it's done."""
+    with _index.lock:
+        # A forked worker inherits the attribute but not the thread.
+        if _index.rebuilding is not None and _index.rebuilding.is_alive():
+            return
+        _index.rebuilding = threading.Thread(
+            target=rebuild, name='search-autocomplete', daemon=True
+        )
+    _index.rebuilding.start()
+
+
+def get_index():
+    """Return this process's index, brought up to date."""
+    sequence = get_sequence()
+    if _index.built_at is None:
+        _index.build(sequence)
+        return _index
+    if not (
+        _index.sequence <= sequence <= _index.sequence + MAX_CHANGES
+        and _index.catch_up(sequence)
+    ):
+        rebuild_later()
+    elif time.monotonic() - _index.built_at > settings.AUTOCOMPLETE_REFRESH:
+        rebuild_later()
+    return _index
+
+
+def suggest(query_string, limit=10):
+    """Return up to ``limit`` suggestions for what's typed, most popular first."""
+    return get_index().suggest(query_string, limit)
+
+
+def refresh(kind, *pks):
+    """Log the new suggestions of some objects for every process, after commit."""
+    loaders = {
+        'page': lambda: load_pages(Page.objects.filter(pk__in=pks)),
+        'category': lambda: load_categories(BlogCategory.objects.filter(pk__in=pks)),
+        'author': lambda: load_authors(BlogAuthor.objects.filter(pk__in=pks)),
+    }
+
+    def publish():
+        entries = loaders[kind]()
+        for pk in pks:
+            # Gone, unpublished or private: no suggestions.
+            entries.setdefault((kind, pk), {})
+        get_sequence()
+        # incr() isn't atomic on every backend, don't overwrite a change.
+        while not cache.add(
+            change_key(cache.incr(SEQUENCE_KEY)), entries, settings.AUTOCOMPLETE_REFRESH
+        ):
+            pass
+    transaction.on_commit(publish)
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite Full-Text Search Backend
+
+A Wagtail search backend on an SQLite FTS5 index kept in the site database,
+so searches look words up in an inverted index instead of scanning every
+indexed column the way the database backend does, and no search service has
+to run next to the site:
+
+    WAGTAILSEARCH_BACKENDS = {
+        'default': {'BACKEND': 'search.backend'},
+    }
+
+* Results are ranked by BM25.
+* Words are stemmed (Porter), so "running" also finds "runs".
+* Words in double quotes match as a phrase: ``"rich text" blocks``.
+* Field boosts count: the index has eight text columns and search fields go
+  into them by boost, highest boost first. Run ``manage.py update_index``
+  after changing boosts.
+
+A plain SearchField on a relation indexes nothing; relations are indexed
+with RelatedFields.
+
+Saved and deleted objects are indexed in the background, see
+search/indexing.py; ``update_index`` and add_bulk() index right away.
+
+On any other database (PostgreSQL, MySQL) Wagtail's database backend is used
+instead, with a warning.
+"""
+import re
+from functools import lru_cache
+from logging import getLogger
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections, models, transaction
+from django.db.models import Manager
+from django.utils.encoding import force_text
+from django.utils.html import strip_tags
+from wagtail.search.backends.base import (
+    BaseSearchBackend, BaseSearchQueryCompiler, BaseSearchResults
+)
+from wagtail.search.backends.db import DatabaseSearchBackend
+from wagtail.search.index import RelatedFields, SearchField, get_indexed_models
+from wagtail.search.query import And, Boost, MatchAll, Not, Or, PlainText
+from wagtail.search.utils import OR
+
+from . import indexing
+from .models import IndexEntry
+
+
+logger = getLogger(__name__)
+
+# The FTS5 table, see search/migrations/0001_initial.py.
+FTS_TABLE = 'search_index'
+COLUMNS = ('a', 'b', 'c', 'd', 'e', 'f', 'g', 'h')
+# Words and "quoted phrases".
+QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def get_search_fields(fields):
+    """Yield the SearchFields in ``fields``, including those of RelatedFields."""
+    for field in fields:
+        if isinstance(field, SearchField):
+            yield field
+        elif isinstance(field, RelatedFields):
+            yield from get_search_fields(field.fields)
+
+
+def get_boost(field):
+    return 1.0 if field.boost is None else float(field.boost)
+
+
+@lru_cache()
+def column_boosts():
+    """
+    Return the boost each column stands for, highest first.
+
+    These are the highest distinct boosts of all search fields. Fields with
+    lower boosts than all of them share the last column.
+    """
+    boosts = {1.0}
+    for model in get_indexed_models():
+        boosts.update(map(get_boost, get_search_fields(model.get_search_fields())))
+    boosts = sorted(boosts, reverse=True)[:len(COLUMNS)]
+    # Unused columns are empty, their weight doesn't matter.
+    return boosts + [boosts[-1]] * (len(COLUMNS) - len(boosts))
+
+
+def get_column(field):
+    """The index column of a search field."""
+    boost = get_boost(field)
+    for column, column_boost in zip(COLUMNS, column_boosts()):
+        if boost >= column_boost:
+            return column
+    return COLUMNS[-1]
+
+
+def get_descendant_models(model):
+    """``model`` and its subclasses, which are indexed under their own type."""
+    return {other for other in apps.get_models() if issubclass(other, model)} | {model}
+
+
+class Index:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.index_name
+        self.connection = connections[DEFAULT_DB_ALIAS]
+
+    def add_model(self, model):
+        pass
+
+    def refresh(self):
+        pass
+
+    def prepare_value(self, value):
+        if value is None:
+            return ''
+        if isinstance(value, str):
+            return strip_tags(value)
+        if isinstance(value, (list, tuple)):
+            return '\n'.join(self.prepare_value(item) for item in value)
+        if isinstance(value, dict):
+            return '\n'.join(self.prepare_value(item) for item in value.values())
+        return force_text(value)
+
+    def prepare_field(self, obj, field):
+        """Yield ``(column, text)`` for a search field of ``obj``."""
+        if isinstance(field, SearchField):
+            try:
+                if field.get_field(type(obj)).is_relation:
+                    return
+            except FieldDoesNotExist:
+                # A method or property.
+                pass
+            yield get_column(field), self.prepare_value(field.get_value(obj))
+        elif isinstance(field, RelatedFields):
+            value = field.get_value(obj)
+            if value is None:
+                return
+            if isinstance(value, Manager):
+                related = value.all()
+            else:
+                related = [value() if callable(value) else value]
+            for related_obj in related:
+                for related_field in field.fields:
+                    yield from self.prepare_field(related_obj, related_field)
+
+    def prepare_obj(self, obj, search_fields):
+        """Return the text of each column for ``obj``."""
+        texts = {column: [] for column in COLUMNS}
+        for field in search_fields:
+            for column, text in self.prepare_field(obj, field):
+                if text:
+                    texts[column].append(text)
+        return ['\n'.join(texts[column]) for column in COLUMNS]
+
+    def entry_ids(self, content_type, object_ids):
+        return dict(
+            IndexEntry.objects.filter(
+                content_type=content_type, object_id__in=object_ids
+            ).values_list('object_id', 'pk')
+        )
+
+    def add_item(self, obj):
+        self.add_items(obj._meta.model, [obj])
+
+    def add_items(self, model, objs):
+        search_fields = model.get_search_fields()
+        if not search_fields or not objs:
+            return
+        content_type = ContentType.objects.get_for_model(model)
+        rows = {obj.pk: self.prepare_obj(obj, search_fields) for obj in objs}
+        with transaction.atomic():
+            existing = self.entry_ids(content_type, rows)
+            IndexEntry.objects.bulk_create([
+                IndexEntry(content_type=content_type, object_id=object_id)
+                for object_id in rows if object_id not in existing
+            ])
+            entry_ids = self.entry_ids(content_type, rows)
+            columns = ', '.join(COLUMNS)
+            placeholders = ', '.join(['%s'] * len(COLUMNS))
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, {columns}) '
+                    f'VALUES (%s, {placeholders})',
+                    [[entry_ids[object_id]] + texts for object_id, texts in rows.items()]
+                )
+
+    def delete_item(self, obj):
+        self.delete_items(obj._meta.model, [obj.pk])
+
+    def delete_items(self, model, pks):
+        content_type = ContentType.objects.get_for_model(model)
+        entry_ids = list(self.entry_ids(content_type, pks).values())
+        if not entry_ids:
+            return
+        with transaction.atomic():
+            with self.connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [[entry_id] for entry_id in entry_ids]
+                )
+            IndexEntry.objects.filter(pk__in=entry_ids).delete()
+
+    def clear(self):
+        with transaction.atomic():
+            with self.connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            IndexEntry.objects.all().delete()
+
+    def __str__(self):
+        return self.name
+
+
+class SQLiteSearchQueryCompiler(BaseSearchQueryCompiler):
+    # Like the database backend, every word has to match by default.
+    DEFAULT_OPERATOR = 'and'
+    # Match words as prefixes, for autocomplete.
+    prefix_match = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.columns = None
+        if self.fields is not None:
+            fields = {
+                field.field_name: field for field in
+                get_search_fields(self.queryset.model.get_searchable_search_fields())
+            }
+            self.columns = sorted({
+                get_column(fields[name]) for name in self.fields if name in fields
+            })
+
+    def build_terms(self, query_string):
+        terms = []
+        for phrase, word in QUERY_TERM.findall(query_string):
+            text = (phrase or word).strip()
+            if text:
+                # Quoted, any FTS5 syntax in the text is taken literally.
+                term = '"%s"' % text.replace('"', '""')
+                terms.append(term + '*' if self.prefix_match else term)
+        return terms
+
+    def build_match(self, query):
+        """Return the FTS5 query for a search query, None if nothing matches."""
+        if isinstance(query, PlainText):
+            terms = self.build_terms(query.query_string)
+            if not terms:
+                return None
+            operator = ' AND ' if query.operator == 'and' else ' OR '
+            return '(%s)' % operator.join(terms)
+        if isinstance(query, Boost):
+            # Rank is by field boosts only.
+            return self.build_match(query.subquery)
+        if isinstance(query, Or):
+            matches = [match for match in map(self.build_match, query.subqueries) if match]
+            return '(%s)' % ' OR '.join(matches) if matches else None
+        if isinstance(query, And):
+            # FTS5's NOT is binary: "a NOT b".
+            included = [sub for sub in query.subqueries if not isinstance(sub, Not)]
+            excluded = [sub.subquery for sub in query.subqueries if isinstance(sub, Not)]
+            if not included:
+                raise NotImplementedError(
+                    'The SQLite search backend needs something to match besides `Not`.'
+                )
+            matches = [self.build_match(sub) for sub in included]
+            if None in matches:
+                return None
+            match = ' AND '.join(matches)
+            for sub in excluded:
+                exclude = self.build_match(sub)
+                if exclude:
+                    match += ' NOT ' + exclude
+            return '(%s)' % match
+        raise NotImplementedError(
+            '`%s` is not supported by the SQLite search backend.'
+            % query.__class__.__name__
+        )
+
+    def search(self, start, stop, score_field=None):
+        queryset = self.queryset
+        if isinstance(self.query, MatchAll):
+            return queryset[start:stop]
+        match = self.build_match(self.query)
+        if match is None:
+            return queryset.none()
+        if self.columns is not None:
+            match = '{%s} : %s' % (' '.join(self.columns), match)
+
+        model = queryset.model
+        entry_table = IndexEntry._meta.db_table
+        content_types = [
+            content_type.pk for content_type in
+            ContentType.objects.get_for_models(*get_descendant_models(model)).values()
+        ]
+        # bm25() is lower for better matches.
+        weights = ', '.join(map(str, column_boosts()))
+        score_field = score_field or '_search_score'
+        queryset = queryset.extra(
+            select={score_field: f'-bm25({FTS_TABLE}, {weights})'},
+            tables=[entry_table, FTS_TABLE],
+            where=[
+                f'{FTS_TABLE} MATCH %s',
+                f'{FTS_TABLE}.rowid = {entry_table}.id',
+                f'{entry_table}.object_id = {model._meta.db_table}.{model._meta.pk.column}',
+                '%s.content_type_id IN (%s)' % (
+                    entry_table, ', '.join(['%s'] * len(content_types))
+                ),
+            ],
+            params=[match] + content_types,
+        )
+        if self.order_by_relevance:
+            queryset = queryset.order_by('-' + score_field, '-pk')
+        elif not queryset.query.order_by:
+            queryset = queryset.order_by('-pk')
+        return queryset[start:stop]
+
+    def _process_lookup(self, field, lookup, value):
+        return models.Q(**{field.get_attname(self.queryset.model) + '__' + lookup: value})
+
+    def _connect_filters(self, filters, connector, negated):
+        if connector == 'AND':
+            q = models.Q(*filters)
+        elif connector == 'OR':
+            q = OR([models.Q(fil) for fil in filters])
+        else:
+            return
+        if negated:
+            q = ~q
+        return q
+
+
+class SQLiteAutocompleteQueryCompiler(SQLiteSearchQueryCompiler):
+    prefix_match = True
+
+
+class SQLiteSearchResults(BaseSearchResults):
+
+    def _do_search(self):
+        return list(self.query_compiler.search(
+            self.start, self.stop, score_field=self._score_field
+        ))
+
+    def _do_count(self):
+        return self.query_compiler.search(None, None).count()
+
+
+class SQLiteSearchRebuilder:
+    """Rebuild the index in one transaction, searches use the old one till then."""
+
+    def __init__(self, index):
+        self.index = index
+        self.transaction = transaction.atomic()
+
+    def start(self):
+        self.transaction.__enter__()
+        self.index.clear()
+        return self.index
+
+    def finish(self):
+        self.transaction.__exit__(None, None, None)
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    query_compiler_class = SQLiteSearchQueryCompiler
+    autocomplete_query_compiler_class = SQLiteAutocompleteQueryCompiler
+    results_class = SQLiteSearchResults
+    rebuilder_class = SQLiteSearchRebuilder
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.index_name = params.get('INDEX', 'default')
+        self.index = Index(self)
+
+    def get_index_for_model(self, model):
+        return self.index
+
+    def reset_index(self):
+        self.index.clear()
+
+    def add_type(self, model):
+        pass  # Not needed.
+
+    def refresh_index(self):
+        pass  # Not needed.
+
+    def add(self, obj):
+        indexing.index_later(obj._meta.model, obj.pk)
+
+    def add_bulk(self, model, obj_list):
+        self.index.add_items(model, obj_list)
+
+    def delete(self, obj):
+        indexing.delete_later(obj._meta.model, obj.pk)
+
+    def delete_bulk(self, model, pks):
+        self.index.delete_items(model, pks)
+
+
+@lru_cache()
+def warn_database_backend(vendor):
+    """Warn once, Wagtail makes a backend for every search and save."""
+    logger.warning(f'search.backend needs SQLite, using the database backend on {vendor}')
+
+
+def SearchBackend(params):
+    """The SQLite backend, or Wagtail's database backend on other databases."""
+    vendor = connections[DEFAULT_DB_ALIAS].vendor
+    if vendor == 'sqlite':
+        return SQLiteSearchBackend(params)
+    warn_database_backend(vendor)
+    return DatabaseSearchBackend(params)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Search Result Cache
+
+Most searches are the same few popular queries, and each one runs the backend
+search and the count again. A page of results is instead cached as the IDs
+of the pages on it plus what the pagination needs (total, page number or
+cursors), keyed on the site, the normalised query and the page asked for.
+A hit loads its pages with one query:
+
+    search_results = cached_results(request, query, page, lambda: run_search())
+
+Entries are only kept as long as the cache generation doesn't change;
+search/signals.py moves it on whenever a page is published, unpublished or
+deleted, and search/indexing.py whenever it has updated the index.
+"""
+import hashlib
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.core.paginator import Page as NumberedPage
+from django.core.paginator import Paginator
+from django.db import transaction
+from wagtail.core.models import Page
+from wagtail.search.utils import normalise_query_string
+
+from learnwt.pagination import CursorPage
+
+
+GENERATION_KEY = 'search_cache:generation'
+# The generation keeps entries current, this only frees unused ones.
+TIMEOUT = 60 * 60 * 24
+
+
+class ResultCount:
+    """Stands in for the results in a Paginator, which only counts them."""
+
+    def __init__(self, count):
+        self._count = count
+
+    def count(self):
+        return self._count
+
+
+def get_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, uuid4().hex, None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def purge():
+    """Drop every cached result, after commit."""
+    transaction.on_commit(lambda: cache.set(GENERATION_KEY, uuid4().hex, None))
+
+
+def results_key(request, query_string, position):
+    site_id = request.site.pk if getattr(request, 'site', None) else None
+    location = f'{site_id}:{normalise_query_string(query_string)}:{position}'
+    return (
+        f'search_cache:results:{get_generation()}:'
+        + hashlib.md5(location.encode()).hexdigest()
+    )
+
+
+def freeze(results):
+    """Return what's cached of a page of results."""
+    ids = [page.pk for page in results]
+    if isinstance(results, CursorPage):
+        return ('cursor', ids, results.next_cursor, results.previous_cursor)
+    paginator = results.paginator
+    return ('numbered', ids, results.number, paginator.count, paginator.per_page)
+
+
+def thaw(entry):
+    """Rebuild a page of results from a cache entry."""
+    kind, ids, *pagination = entry
+    pages = Page.objects.live().in_bulk(ids)
+    object_list = [pages[pk] for pk in ids if pk in pages]
+    if kind == 'cursor':
+        next_cursor, previous_cursor = pagination
+        return CursorPage(
+            object_list, None,
+            next_cursor=next_cursor, previous_cursor=previous_cursor,
+        )
+    number, count, per_page = pagination
+    return NumberedPage(object_list, number, Paginator(ResultCount(count), per_page))
+
+
+def cached_results(request, query_string, position, search):
+    """
+    Return the page of results at ``position`` (a page number or cursor),
+    calling ``search()`` for it if it isn't cached.
+    """
+    key = results_key(request, query_string, position)
+    entry = cache.get(key)
+    if entry is not None:
+        return thaw(entry)
+    results = search()
+    cache.set(key, freeze(results), TIMEOUT)
+    return results
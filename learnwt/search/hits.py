@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Search Hit Recording
+
+``Query.get(query_string).add_hit()`` reads and writes two tables on every
+search, on SQLite under a database-wide write lock, so searches queue up
+behind each other's bookkeeping. Instead, searches count their hits in memory
+and a background thread writes the totals every
+``settings.SEARCH_HITS_FLUSH_INTERVAL`` seconds, in one transaction:
+
+    record_hit(search_query)
+
+The popular query statistics (Query.get_most_popular()) are the same, only up
+to one interval late. Hits still buffered when a worker is killed are lost, as
+are hits that failed to be written MAX_FLUSH_ATTEMPTS times.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+from logging import getLogger
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from wagtail.search.models import Query, QueryDailyHits
+from wagtail.search.utils import normalise_query_string
+
+
+logger = getLogger(__name__)
+
+# Failed flushes after which hits are dropped, so writes that keep failing
+# don't grow the buffer and the log forever.
+MAX_FLUSH_ATTEMPTS = 3
+
+# (normalised query string, date) -> hits not written yet
+_hits = Counter()
+# (normalised query string, date) -> failed flushes of its hits
+_failures = Counter()
+_hits_lock = threading.Lock()
+_flusher = None
+
+
+def record_hit(query_string):
+    """Count a search for ``query_string``, written by the next flush()."""
+    query_string = normalise_query_string(query_string)
+    if not query_string:
+        return
+    with _hits_lock:
+        _hits[(query_string, timezone.now().date())] += 1
+    if not settings.SEARCH_HITS_FLUSH_INTERVAL:
+        flush()
+    else:
+        start_flusher()
+
+
+def flush():
+    """Write the buffered hits, returns how many searches they were."""
+    with _hits_lock:
+        hits = dict(_hits)
+        _hits.clear()
+    if not hits:
+        return 0
+
+    try:
+        with transaction.atomic():
+            write_hits(hits)
+    except DatabaseError:
+        logger.exception(f'Could not write {len(hits)} search hit counts')
+        retry(hits)
+        return 0
+    with _hits_lock:
+        for key in hits:
+            _failures.pop(key, None)
+    return sum(hits.values())
+
+
+def write_hits(hits):
+    """Add ``hits`` to the daily totals, creating the queries and days missing."""
+    query_strings = {query_string for query_string, date in hits}
+    Query.objects.bulk_create(
+        [Query(query_string=query_string) for query_string in query_strings],
+        ignore_conflicts=True,
+    )
+    query_ids = dict(
+        Query.objects.filter(query_string__in=query_strings).values_list('query_string', 'pk')
+    )
+    missing = []
+    for (query_string, date), count in hits.items():
+        updated = QueryDailyHits.objects.filter(
+            query_id=query_ids[query_string], date=date
+        ).update(hits=F('hits') + count)
+        if not updated:
+            missing.append(QueryDailyHits(
+                query_id=query_ids[query_string], date=date, hits=count
+            ))
+    # A day another process adds meanwhile fails the insert, and the whole
+    # batch is retried.
+    QueryDailyHits.objects.bulk_create(missing)
+
+
+def retry(hits):
+    """Buffer ``hits`` again for the next flush, unless they failed too often."""
+    dropped = 0
+    with _hits_lock:
+        for key, count in hits.items():
+            _failures[key] += 1
+            if _failures[key] < MAX_FLUSH_ATTEMPTS:
+                _hits[key] += count
+            else:
+                del _failures[key]
+                dropped += count
+    if dropped:
+        logger.error(f'Dropped {dropped} search hits after {MAX_FLUSH_ATTEMPTS} failed writes')
+
+
+def run_flusher():
+    while True:
+        time.sleep(settings.SEARCH_HITS_FLUSH_INTERVAL)
+        try:
+            flush()
+        finally:
+            connection.close()
+
+
+def start_flusher():
+    """Start the flush thread, in this process, if it isn't running."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _hits_lock:
+        # A forked worker inherits the object but not the thread.
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(
+                target=run_flusher, name='search-hits', daemon=True
+            )
+            _flusher.start()
+
+
+atexit.register(flush)
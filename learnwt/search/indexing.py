@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Background Search Indexing
+
+Wagtail updates the search index from the save signal, so every publish
+waits for the page (StreamField, authors, categories, image) to be turned
+into index text. search/backend.py only queues the object instead, and a
+background thread indexes what's queued ``settings.SEARCH_INDEX_DELAY``
+seconds later:
+
+* objects saved several times within the delay are indexed once, from the
+  database, as they are by then;
+* objects are loaded and indexed in one batch per model.
+
+Nothing is queued before the saving transaction commits. A delay of 0
+indexes right after the commit instead. Objects still queued when a worker
+is killed are caught by the next ``manage.py update_index``.
+"""
+import threading
+import time
+from collections import defaultdict
+from logging import getLogger
+
+from django.conf import settings
+from django.db import connection, transaction
+from wagtail.search.backends import get_search_backends
+
+from . import cache
+
+
+logger = getLogger(__name__)
+
+# (model, pk) -> True to index the object, False to remove it
+_pending = {}
+_pending_lock = threading.Lock()
+_wake = threading.Event()
+_worker = None
+
+
+def index_later(model, pk):
+    """Queue an object to be (re)indexed."""
+    _queue(model, pk, True)
+
+
+def delete_later(model, pk):
+    """Queue an object to be removed from the index."""
+    _queue(model, pk, False)
+
+
+def _queue(model, pk, index):
+    def queue():
+        with _pending_lock:
+            _pending[(model, pk)] = index
+        if not settings.SEARCH_INDEX_DELAY:
+            process()
+        else:
+            start_worker()
+            _wake.set()
+    transaction.on_commit(queue)
+
+
+def process():
+    """Index and remove what's queued, returns how many objects that was."""
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return 0
+
+    to_index, to_delete = defaultdict(list), defaultdict(list)
+    for (model, pk), index in pending.items():
+        (to_index if index else to_delete)[model].append(pk)
+    for backend in get_search_backends(with_auto_update=True):
+        for model, pks in to_index.items():
+            try:
+                backend.add_bulk(
+                    model, list(model.get_indexed_objects().filter(pk__in=pks))
+                )
+            except Exception:
+                logger.exception(f'Could not index {model.__name__} {pks}')
+        for model, pks in to_delete.items():
+            try:
+                backend.delete_bulk(model, pks)
+            except Exception:
+                logger.exception(f'Could not remove {model.__name__} {pks} from the index')
+    # Results cached before the index changed are out of date.
+    cache.purge()
+    return len(pending)
+
+
+def run_worker():
+    while True:
+        _wake.wait()
+        # Let repeated saves of the same object pile up.
+        time.sleep(settings.SEARCH_INDEX_DELAY)
+        _wake.clear()
+        try:
+            process()
+        finally:
+            connection.close()
+
+
+def start_worker():
+    """Start the indexing thread, in this process, if it isn't running."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _pending_lock:
+        # A forked worker inherits the object but not the thread.
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(
+                target=run_worker, name='search-indexing', daemon=True
+            )
+            _worker.start()
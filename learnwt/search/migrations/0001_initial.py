@@ -0,0 +1,50 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # Other databases fall back to Wagtail's database backend.
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(
+            """
+            CREATE VIRTUAL TABLE search_index USING fts5(
+                a, b, c, d, e, f, g, h,
+                tokenize = 'porter unicode61 remove_diacritics 1',
+                prefix = '2 3'
+            )
+            """
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE search_index')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.IntegerField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.ContentType')),
+            ],
+            options={
+                'verbose_name': 'Search Index Entry',
+                'verbose_name_plural': 'Search Index Entries',
+                'unique_together': {('content_type', 'object_id')},
+            },
+        ),
+        # One text column per boost level, see search/backend.py.
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+Search Index Models
+
+The rows of the full-text index used by search/backend.py. The text itself
+lives in an SQLite FTS5 table (``search_index``, created by the migrations)
+whose rowid is the IndexEntry's id.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class IndexEntry(models.Model):
+    """Ties an FTS5 row to the object it was made from."""
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    # Indexed models have integer primary keys, searches join on them.
+    object_id = models.IntegerField()
+
+    class Meta:
+        unique_together = ('content_type', 'object_id')
+        verbose_name = 'Search Index Entry'
+        verbose_name_plural = 'Search Index Entries'
+
+    def __str__(self):
+        return f'{self.content_type_id}:{self.object_id}'
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Search Signals
+
+Drop the cached search results (search/cache.py) when the set of live pages
+or what they're found by changes, keep the autocomplete suggestions
+(search/autocomplete.py) up to date, also when view restrictions hide or show
+pages, and reindex the objects whose index text
+shows a related object (RelatedFields) when that object changes: renaming a
+category reindexes the pages in it and nothing else.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from modelcluster.fields import ParentalKey
+from wagtail.core.models import Page, PageViewRestriction
+from wagtail.core.signals import page_published, page_unpublished
+from wagtail.search.index import RelatedFields, get_indexed_models
+
+from blog.models import BlogAuthor, BlogCategory
+
+from . import autocomplete, cache, indexing
+
+
+@receiver(page_published)
+@receiver(page_unpublished)
+def purge_published(sender, instance, **kwargs):
+    cache.purge()
+    autocomplete.refresh('page', instance.pk)
+
+
+@receiver(post_delete)
+def purge_deleted(sender, instance, **kwargs):
+    if isinstance(instance, Page):
+        cache.purge()
+        autocomplete.refresh('page', instance.pk)
+
+
+@receiver(post_save, sender=PageViewRestriction)
+@receiver(post_delete, sender=PageViewRestriction)
+def refresh_restricted(sender, instance, **kwargs):
+    """Only public pages are suggested, a restriction covers the pages below too."""
+    pages = Page.objects.descendant_of(instance.page, inclusive=True)
+    autocomplete.refresh('page', *pages.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=BlogCategory)
+@receiver(post_delete, sender=BlogCategory)
+def refresh_category(sender, instance, **kwargs):
+    autocomplete.refresh('category', instance.pk)
+
+
+@receiver(post_save, sender=BlogAuthor)
+@receiver(post_delete, sender=BlogAuthor)
+def refresh_author(sender, instance, **kwargs):
+    autocomplete.refresh('author', instance.pk)
+
+
+def is_cluster_child(model):
+    """Inline children are saved along with their parent, which is indexed then."""
+    return any(isinstance(field, ParentalKey) for field in model._meta.concrete_fields)
+
+
+def get_related_lookups():
+    """
+    Map each model indexed through RelatedFields to ``(indexed model, lookup)``
+    pairs, the lookup finding the indexed objects that show an instance.
+    """
+    lookups = defaultdict(set)
+
+    def add_lookups(model, fields, indexed_model, prefix=''):
+        for field in fields:
+            if isinstance(field, RelatedFields):
+                related_model = field.get_field(model).related_model
+                lookup = prefix + field.field_name
+                if not is_cluster_child(related_model):
+                    lookups[related_model].add((indexed_model, lookup))
+                add_lookups(related_model, field.fields, indexed_model, lookup + '__')
+
+    for model in get_indexed_models():
+        add_lookups(model, model.get_search_fields(), model)
+
+    # Page subclasses inherit their parents' search fields; the parent's
+    # lookup finds their pages too, see reindex_related().
+    return {
+        related_model: {
+            (model, lookup) for model, lookup in pairs
+            if not any(
+                (parent, lookup) in pairs for parent in model._meta.get_parent_list()
+            )
+        }
+        for related_model, pairs in lookups.items()
+    }
+
+
+RELATED_LOOKUPS = get_related_lookups()
+
+
+def reindex_related(sender, instance, created=False, **kwargs):
+    if created:
+        # Nothing shows it yet.
+        return
+    for model, lookup in RELATED_LOOKUPS[sender]:
+        objects = model._default_manager.filter(**{lookup: instance.pk})
+        if issubclass(model, Page):
+            # Each page is indexed as its own type.
+            for pk, content_type_id in objects.values_list('pk', 'content_type_id'):
+                page_model = ContentType.objects.get_for_id(content_type_id).model_class()
+                indexing.index_later(page_model, pk)
+        else:
+            for pk in objects.values_list('pk', flat=True):
+                indexing.index_later(model, pk)
+
+
+for related_model in RELATED_LOOKUPS:
+    post_save.connect(reindex_related, sender=related_model)
+    # Before the delete cascades, while the lookups still find the objects.
+    pre_delete.connect(reindex_related, sender=related_model)
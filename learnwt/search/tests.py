@@ -0,0 +1,340 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from wagtail.core.models import Page, PageViewRestriction
+from wagtail.search.backends import get_search_backend
+from wagtail.search.backends.db import DatabaseSearchBackend
+from wagtail.search.models import Query
+
+from blog.models import BlogAuthor, BlogCategory, BlogDetailPage
+from learnwt.pagination import CursorPaginator
+from learnwt.testing import create_post, create_site, test_settings
+
+from . import autocomplete, hits, indexing
+from .backend import SearchBackend, SQLiteSearchBackend
+from .cache import cached_results
+from .models import IndexEntry
+
+
+@test_settings
+class SQLiteSearchBackendTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(4)]
+        self.backend = get_search_backend()
+        self.write(0, 'Zebras', 'Notes on horses.')
+        self.write(1, 'Horses', 'A zebra ran past the stable.')
+        self.write(2, 'Editors', 'Rich text blocks are easy to write.')
+        self.write(3, 'Blocks', 'Text blocks and rich pictures.')
+        self.backend.add_bulk(BlogDetailPage, BlogDetailPage.objects.all())
+
+    def write(self, number, title, body):
+        post = self.posts[number]
+        post.title = title
+        post.content = json.dumps([{'type': 'full_richtext', 'value': f'<p>{body}</p>'}])
+        post.save()
+
+    def search(self, query):
+        return [page.title for page in BlogDetailPage.objects.search(query)]
+
+    def test_uses_the_sqlite_backend(self):
+        self.assertIsInstance(self.backend, SQLiteSearchBackend)
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.search('zebra'), ['Zebras', 'Horses'])
+        self.assertEqual(self.search('horses'), ['Horses', 'Zebras'])
+
+    def test_words_are_stemmed(self):
+        self.assertEqual(self.search('writing'), ['Editors'])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('zebra stable'), ['Horses'])
+
+    def test_phrases(self):
+        self.assertEqual(sorted(self.search('rich text')), ['Blocks', 'Editors'])
+        self.assertEqual(self.search('"rich text"'), ['Editors'])
+
+    def test_query_syntax_is_taken_literally(self):
+        self.assertEqual(self.search('zebra AND NOT'), [])
+        self.assertEqual(self.search('"zebra'), ['Zebras', 'Horses'])
+
+    def test_deleted_pages_leave_the_index(self):
+        post = self.posts[0]
+        self.backend.delete_bulk(BlogDetailPage, [post.pk])
+        self.assertEqual(self.search('zebra'), ['Horses'])
+        self.assertFalse(IndexEntry.objects.filter(object_id=post.pk).exists())
+
+    def test_other_databases_use_the_database_backend(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            self.assertIsInstance(SearchBackend({}), DatabaseSearchBackend)
+
+
+@test_settings
+class AutocompleteTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.categories = [BlogCategory.objects.create(name=f'Category {i}') for i in range(2)]
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        # A fresh process, whose rebuilds are run by hand.
+        mock.patch.object(autocomplete, '_index', autocomplete.PrefixIndex()).start()
+        self.rebuild_later = mock.patch.object(autocomplete, 'rebuild_later').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def suggest(self, query_string):
+        return [suggestion.text for suggestion in autocomplete.suggest(query_string)]
+
+    def publish_title(self, post, title):
+        post.title = title
+        post.custom_title = title
+        post.save_revision().publish()
+
+    def test_suggestions(self):
+        self.assertEqual(self.suggest('pos'), ['Post 0', 'Post 1'])
+        self.assertEqual(self.suggest('post 1'), ['Post 1'])
+        self.assertEqual(self.suggest('categ'), ['Category 0', 'Category 1'])
+
+    def test_changes_are_applied_without_a_rebuild(self):
+        self.suggest('pos')
+        self.publish_title(self.posts[0], 'Quokkas')
+        self.categories[1].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('quo'), ['Quokkas'])
+            self.assertEqual(self.suggest('pos'), ['Post 1'])
+            self.assertEqual(self.suggest('categ'), ['Category 0'])
+        self.rebuild_later.assert_not_called()
+
+    def test_lost_changes_rebuild_in_the_background(self):
+        self.suggest('pos')
+        self.publish_title(self.posts[0], 'Quokkas')
+        cache.delete(autocomplete.change_key(cache.get(autocomplete.SEQUENCE_KEY)))
+        self.assertEqual(self.suggest('quo'), [])
+        self.rebuild_later.assert_called_once_with()
+        autocomplete.rebuild()
+        self.assertEqual(self.suggest('quo'), ['Quokkas'])
+
+    def test_processes_far_behind_rebuild(self):
+        self.suggest('pos')
+        cache.incr(autocomplete.SEQUENCE_KEY, autocomplete.MAX_CHANGES + 1)
+        self.suggest('pos')
+        self.rebuild_later.assert_called_once_with()
+
+    @override_settings(AUTOCOMPLETE_REFRESH=0)
+    def test_refresh_rebuilds_in_the_background(self):
+        self.suggest('pos')
+        self.suggest('pos')
+        self.rebuild_later.assert_called_once_with()
+
+    def test_view_restrictions_hide_pages(self):
+        self.assertEqual(self.suggest('blog'), ['Blog'])
+        restriction = PageViewRestriction.objects.create(
+            page=self.site.listing, restriction_type=PageViewRestriction.LOGIN
+        )
+        self.assertEqual(self.suggest('blog'), [])
+        self.assertEqual(self.suggest('pos'), [])
+        restriction.delete()
+        self.assertEqual(self.suggest('pos'), ['Post 0', 'Post 1'])
+
+
+@override_settings(SEARCH_HITS_FLUSH_INTERVAL=60)
+@test_settings
+class SearchHitsTests(TestCase):
+
+    def setUp(self):
+        mock.patch.object(hits, '_hits', hits.Counter()).start()
+        mock.patch.object(hits, '_failures', hits.Counter()).start()
+        self.start_flusher = mock.patch.object(hits, 'start_flusher').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def popular(self):
+        return [
+            (query.query_string, query._hits) for query in Query.get_most_popular()
+        ]
+
+    def test_hits_are_buffered(self):
+        with self.assertNumQueries(0):
+            hits.record_hit('Zebras')
+            hits.record_hit('  ZEBRAS ')
+            hits.record_hit('')
+        self.start_flusher.assert_called_with()
+        self.assertEqual(self.popular(), [])
+        self.assertEqual(hits.flush(), 2)
+        self.assertEqual(self.popular(), [('zebras', 2)])
+
+    def test_one_write_per_query(self):
+        Query.get('horses').add_hit()
+        for query_string in ['zebras', 'horses', 'zebras', 'quokkas', 'zebras']:
+            hits.record_hit(query_string)
+        # Savepoint, the queries and their ids, an update per query and the
+        # missing days.
+        with self.assertNumQueries(8):
+            self.assertEqual(hits.flush(), 5)
+        self.assertEqual(self.popular(), [('zebras', 3), ('horses', 2), ('quokkas', 1)])
+        with self.assertNumQueries(0):
+            self.assertEqual(hits.flush(), 0)
+
+    def test_failed_writes_are_kept(self):
+        hits.record_hit('zebras')
+        with mock.patch.object(Query.objects, 'filter', side_effect=DatabaseError), \
+                self.assertLogs(hits.logger, 'ERROR'):
+            self.assertEqual(hits.flush(), 0)
+        hits.record_hit('zebras')
+        self.assertEqual(hits.flush(), 2)
+        self.assertEqual(self.popular(), [('zebras', 2)])
+
+    def test_failing_writes_are_dropped(self):
+        hits.record_hit('zebras')
+        with mock.patch.object(Query.objects, 'filter', side_effect=DatabaseError), \
+                self.assertLogs(hits.logger, 'ERROR') as logs:
+            for attempt in range(hits.MAX_FLUSH_ATTEMPTS):
+                self.assertEqual(hits.flush(), 0)
+        self.assertIn('Dropped 1 search hits', logs.output[-1])
+        self.assertEqual(hits.flush(), 0)
+        hits.record_hit('zebras')
+        self.assertEqual(hits.flush(), 1)
+        self.assertEqual(self.popular(), [('zebras', 1)])
+
+    @override_settings(SEARCH_HITS_FLUSH_INTERVAL=0)
+    def test_no_interval_writes_every_search(self):
+        hits.record_hit('zebras')
+        self.start_flusher.assert_not_called()
+        self.assertEqual(self.popular(), [('zebras', 1)])
+
+    def test_searches_record_hits(self):
+        self.client.get('/search/', {'query': 'zebras'})
+        self.client.get('/search/')
+        hits.flush()
+        self.assertEqual(self.popular(), [('zebras', 1)])
+
+
+@test_settings
+class SearchCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(3)]
+        self.request = RequestFactory().get('/search/')
+        self.request.site = self.site.site
+        self.search = mock.Mock(side_effect=lambda: Paginator(
+            Page.objects.type(BlogDetailPage).order_by('pk'), 2
+        ).page(2))
+
+    def results(self, query_string='post', position='page:2'):
+        return cached_results(self.request, query_string, position, self.search)
+
+    def test_results_are_cached(self):
+        results = self.results()
+        with self.assertNumQueries(1):
+            cached = self.results(' POST ')
+            self.assertEqual(list(cached), list(results))
+            self.assertEqual(cached.number, 2)
+            self.assertEqual(cached.paginator.count, 3)
+            self.assertEqual(cached.paginator.num_pages, 2)
+            self.assertTrue(cached.has_previous())
+        self.assertEqual(self.search.call_count, 1)
+
+    def test_keys_include_the_query_position_and_site(self):
+        self.results()
+        self.results('zebras')
+        self.results(position='page:1')
+        self.request.site = self.site.site.__class__(pk=self.site.site.pk + 1)
+        self.results()
+        self.assertEqual(self.search.call_count, 4)
+
+    def test_cursor_pages_are_cached(self):
+        paginator = CursorPaginator(Page.objects.type(BlogDetailPage), 2, ordering=('-id', ))
+        results = cached_results(self.request, 'post', 'cursor:None', paginator.page)
+        cached = cached_results(self.request, 'post', 'cursor:None', self.search)
+        self.search.assert_not_called()
+        self.assertEqual(list(cached), list(results))
+        self.assertEqual(cached.next_cursor, results.next_cursor)
+        self.assertIsNone(cached.previous_cursor)
+
+    def test_publishing_drops_cached_results(self):
+        self.results()
+        self.posts[0].save_revision().publish()
+        self.results()
+        self.assertEqual(self.search.call_count, 2)
+
+    def test_unpublished_pages_are_left_out(self):
+        results = self.results()
+        Page.objects.filter(pk=results[0].pk).update(live=False)
+        self.assertEqual(list(self.results()), [])
+
+
+@test_settings
+class IndexingTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.category = BlogCategory.objects.create(name='Category')
+        self.author = BlogAuthor.objects.create(first_name='Author', last_name='Name')
+        self.posts = [
+            create_post(
+                self.site.listing, i, self.site.image, [self.category], [self.author]
+            )
+            for i in range(2)
+        ]
+        mock.patch.object(indexing, '_pending', {}).start()
+        self.start_worker = mock.patch.object(indexing, 'start_worker').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def search(self, query):
+        return sorted(page.title for page in BlogDetailPage.objects.search(query))
+
+    def test_saves_are_indexed_right_after_commit(self):
+        post = self.posts[0]
+        post.title = 'Quokkas'
+        post.save()
+        self.assertEqual(self.search('quokkas'), ['Quokkas'])
+        self.start_worker.assert_not_called()
+
+    @override_settings(SEARCH_INDEX_DELAY=60)
+    def test_saves_are_indexed_in_the_background(self):
+        post, other = self.posts
+        for title in ['Wombats', 'Quokkas']:
+            other.title = title
+            other.save()
+        post_id = post.pk
+        post.delete()
+        self.start_worker.assert_called_with()
+        self.assertEqual(self.search('quokkas'), [])
+        self.assertTrue(IndexEntry.objects.filter(object_id=post_id).exists())
+        # Both posts, and the listing whose child count the delete saved.
+        self.assertEqual(indexing.process(), 3)
+        self.assertEqual(self.search('quokkas'), ['Quokkas'])
+        self.assertFalse(IndexEntry.objects.filter(object_id=post_id).exists())
+        self.assertEqual(indexing.process(), 0)
+
+    @override_settings(SEARCH_INDEX_DELAY=60)
+    def test_nothing_is_queued_before_commit(self):
+        post = self.posts[0]
+        with transaction.atomic():
+            post.save()
+            self.assertEqual(indexing._pending, {})
+        self.assertEqual(indexing._pending, {(BlogDetailPage, post.pk): True})
+
+    def test_renamed_categories_reindex_their_pages(self):
+        category = self.category
+        titles = sorted(
+            BlogDetailPage.objects.filter(categories=category).values_list('title', flat=True)
+        )
+        self.assertTrue(titles)
+        category.name = 'Marsupials'
+        category.save()
+        self.assertEqual(self.search('marsupials'), titles)
+
+    def test_renamed_authors_reindex_their_pages(self):
+        author = self.author
+        titles = sorted(BlogDetailPage.objects.filter(
+            blog_authors__author=author
+        ).values_list('title', flat=True))
+        self.assertTrue(titles)
+        author.first_name = 'Ada'
+        author.save()
+        self.assertEqual(self.search('ada'), titles)
@@ -1,34 +1,89 @@
+from django.conf import settings
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.http import JsonResponse
 from django.shortcuts import render
 
 from wagtail.core.models import Page
-from wagtail.search.models import Query
+
+from learnwt.pagination import CursorPaginator
+
+from .autocomplete import suggest
+from .cache import cached_results
+from .hits import record_hit
 
 
 def search(request):
     search_query = request.GET.get('query', None)
     page = request.GET.get('page', 1)
 
+    if settings.CURSOR_PAGINATION:
+        return cursor_search(request, search_query)
+
     # Search
     if search_query:
-        search_results = Page.objects.live().search(search_query)
-        query = Query.get(search_query)
+        search_results = cached_results(
+            request, search_query, f'page:{page}',
+            lambda: paginate(Page.objects.live().search(search_query), page)
+        )
 
         # Record hit
-        query.add_hit()
+        record_hit(search_query)
     else:
-        search_results = Page.objects.none()
+        search_results = paginate(Page.objects.none(), page)
+
+    return render(request, 'search/search.html', {
+        'search_query': search_query,
+        'search_results': search_results,
+    })
 
-    # Pagination
+
+def paginate(search_results, page):
     paginator = Paginator(search_results, 10)
     try:
-        search_results = paginator.page(page)
+        return paginator.page(page)
     except PageNotAnInteger:
-        search_results = paginator.page(1)
+        return paginator.page(1)
     except EmptyPage:
-        search_results = paginator.page(paginator.num_pages)
+        return paginator.page(paginator.num_pages)
+
+
+def cursor_search(request, search_query):
+    """
+    Search with keyset pagination, newest pages first.
+
+    The keyset filter is applied to the page queryset before the backend
+    search runs, so deep result pages need neither an OFFSET nor a COUNT.
+    """
+    cursor = request.GET.get('cursor')
+    if search_query:
+        paginator = CursorPaginator(
+            Page.objects.live(), 10, ordering=('-id', ),
+            search=lambda pages: pages.search(
+                search_query, order_by_relevance=False
+            )
+        )
+        search_results = cached_results(
+            request, search_query, f'cursor:{cursor}',
+            lambda: paginator.page(cursor)
+        )
+
+        # Record hit
+        record_hit(search_query)
+    else:
+        search_results = CursorPaginator(Page.objects.none(), 10).page(cursor)
 
     return render(request, 'search/search.html', {
         'search_query': search_query,
         'search_results': search_results,
     })
+
+
+def autocomplete(request):
+    """Return suggestions for what's been typed so far in ``q``, as JSON."""
+    suggestions = suggest(request.GET.get('q', ''))
+    return JsonResponse({
+        'suggestions': [
+            {'text': suggestion.text, 'kind': suggestion.kind, 'url': suggestion.url}
+            for suggestion in suggestions
+        ]
+    })
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class StreamsConfig(AppConfig):
     name = 'streams'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -7,8 +7,12 @@ This file defines custom stream field blocks.
 from wagtail.core import blocks
 from wagtail.images.blocks import ImageChooserBlock
 
+from renditions.prefetch import prefetch_renditions
 
-class TitleAndTextBlock(blocks.StructBlock):
+from .cache import CachedRenderMixin
+
+
+class TitleAndTextBlock(CachedRenderMixin, blocks.StructBlock):
     """Title and text and nothing else."""
 
     title = blocks.CharBlock(required=True, help_text='Add your title', max_length=100)
@@ -20,9 +24,12 @@ class TitleAndTextBlock(blocks.StructBlock):
         label = "Title & Text"
 
 
-class CardBlock(blocks.StructBlock):
+class CardBlock(CachedRenderMixin, blocks.StructBlock):
     """Cards with image, text, and buttons"""
 
+    # Prefetched by streams.references.resolve_references().
+    image_renditions = ['fill-300x300']
+
     title = blocks.CharBlock(required=True, help_text='Add your title', max_length=100)
     cards = blocks.ListBlock(
         blocks.StructBlock([
@@ -33,13 +40,21 @@ class CardBlock(blocks.StructBlock):
             ("button_url", blocks.URLBlock(required=False, help_text="If the button page above is selected, that is rendered preferentially.")),
         ])
     )
+
+    def get_context(self, value, parent_context=None):
+        context = super().get_context(value, parent_context=parent_context)
+        prefetch_renditions(
+            [card['image'] for card in value['cards']], *self.image_renditions
+        )
+        return context
+
     class Meta:
         template = 'streams/card_block.html'
         icon = 'user'
         label = 'Scientist Card'
 
 
-class RichtextBlock(blocks.RichTextBlock):
+class RichtextBlock(CachedRenderMixin, blocks.RichTextBlock):
     """Fully featured Rich Text."""
 
     class Meta:
@@ -65,7 +80,7 @@ class SimpleRichtextBlock(blocks.RichTextBlock):
         label = 'Simple RichText'
 
 
-class CTABlock(blocks.StructBlock):
+class CTABlock(CachedRenderMixin, blocks.StructBlock):
     """A simple Call to Action component."""
 
     title = blocks.CharBlock(required=True, max_length=50)
@@ -91,7 +106,7 @@ class LinkStructValue(blocks.StructValue):
         return url
 
 
-class ButtonBlock(blocks.StructBlock):
+class ButtonBlock(CachedRenderMixin, blocks.StructBlock):
     """Define button for internal or external link."""
     button_page = blocks.PageChooserBlock(required=False, help_text='If selected, this will be used first')  # Internal link
     button_url = blocks.URLBlock(required=False, help_text='Used if button page is not supplied.')  # External link
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Block Render Cache
+
+Opt-in caching of rendered StreamField blocks. A block's HTML only changes
+when its value or something it links to changes, so the cache key is made of:
+
+* the block class;
+* a hash of the block's raw (JSON) value;
+* the page cache tokens (caching/pages.py) of the pages it links to, from
+  page choosers and rich text, which change when those pages are published
+  or moved;
+* the fields that change the renditions of the images it shows.
+
+Unchanged blocks are cache lookups, even on a page whose other blocks were
+just edited:
+
+    class CardBlock(CachedRenderMixin, blocks.StructBlock):
+        ...
+
+Block templates must only depend on the block's value, not on the page or
+request they are rendered for.
+"""
+import hashlib
+import json
+import re
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.safestring import mark_safe
+from wagtail.core import blocks
+from wagtail.core.models import Page
+from wagtail.core.rich_text import RichText
+from wagtail.images import get_image_model
+
+from caching import pages
+from caching.registry import RENDITION_FIELDS
+
+
+RICH_TEXT_TAG = re.compile(r'<(?:a|embed)\b([^>]*)>')
+ATTRIBUTE = re.compile(r'([\w-]+)="([^"]*)"')
+
+
+def rich_text_references(source):
+    """Yield ``(type, id)`` of the pages and images linked from rich text."""
+    for attributes in RICH_TEXT_TAG.findall(source):
+        attributes = dict(ATTRIBUTE.findall(attributes))
+        kind = attributes.get('linktype') or attributes.get('embedtype')
+        if kind in ('page', 'image') and attributes.get('id', '').isdigit():
+            yield kind, int(attributes['id'])
+
+
+def references(block, value):
+    """Yield the pages and images (instances or ``(type, id)``) in a value."""
+    if value is None:
+        return
+    if isinstance(block, blocks.StructBlock):
+        for name, child_block in block.child_blocks.items():
+            yield from references(child_block, value.get(name))
+    elif isinstance(block, blocks.ListBlock):
+        for item in value:
+            yield from references(block.child_block, item)
+    elif isinstance(block, blocks.StreamBlock):
+        for child in value:
+            yield from references(child.block, child.value)
+    elif isinstance(value, (Page, get_image_model())):
+        yield value
+    elif isinstance(value, RichText):
+        yield from rich_text_references(value.source)
+
+
+def image_version(image):
+    return [image.pk] + [str(getattr(image, field)) for field in RENDITION_FIELDS]
+
+
+class CachedRenderMixin:
+    """Cache the rendered HTML of a block, see the module docstring."""
+
+    render_cache_timeout = 60 * 60 * 24 * 7
+
+    def render_cache_key(self, value):
+        page_ids = set()
+        images = []
+        image_ids = set()
+        for reference in references(self, value):
+            if isinstance(reference, Page):
+                page_ids.add(reference.pk)
+            elif isinstance(reference, tuple):
+                kind, pk = reference
+                (page_ids if kind == 'page' else image_ids).add(pk)
+            else:
+                images.append(reference)
+        if image_ids:
+            images += get_image_model().objects.filter(pk__in=image_ids).only(*RENDITION_FIELDS)
+
+        page_ids = sorted(page_ids)
+        parts = [
+            f'{type(self).__module__}.{type(self).__name__}',
+            self.get_prep_value(value),
+            page_ids,
+            # The generation changes when pages move.
+            pages.page_tokens(page_ids),
+            sorted(image_version(image) for image in images),
+        ]
+        digest = hashlib.md5(
+            json.dumps(parts, sort_keys=True, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+        return f'block:{digest}'
+
+    def render(self, value, context=None):
+        key = self.render_cache_key(value)
+        html = cache.get(key)
+        if html is not None:
+            return mark_safe(html)
+
+        # Don't keep HTML that links to renditions still being generated.
+        request = context.get('request') if context else None
+        skips = pages.skip_count(request)
+        html = super().render(value, context=context)
+        if pages.skip_count(request) == skips:
+            cache.set(key, html, self.render_cache_timeout)
+        return html
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from wagtail.core.models import Page
+
+from streams.models import ExpandedRichText
+from streams.richtext import page_sources, refresh, source_key, store_sources
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the front-end HTML of the rich text of every live page, expand "
+        "what is stored already again and drop what no live page uses."
+    )
+
+    def handle(self, *args, **options):
+        started = time.time()
+        sources = set()
+        for page in Page.objects.live().specific().iterator():
+            sources.update(source for source in page_sources(page) if source)
+
+        used = {source_key(source) for source in sources}
+        unused = ExpandedRichText.objects.exclude(pk__in=used)
+        dropped = unused.count()
+        unused.delete()
+        expanded = refresh(ExpandedRichText.objects.all())
+        stored = store_sources(sources)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stored} rich texts stored, {expanded} expanded again and "
+            f"{dropped} unused ones dropped in {time.time() - started:.1f}s."
+        ))
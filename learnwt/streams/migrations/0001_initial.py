@@ -0,0 +1,31 @@
+# Generated by Django 2.2.4 on 2026-10-18 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('wagtailcore', '0041_group_collection_permissions_verbose_name_plural'),
+        ('wagtailimages', '0001_squashed_0021'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpandedRichText',
+            fields=[
+                ('source_hash', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('source', models.TextField()),
+                ('html', models.TextField()),
+                ('expanded_at', models.DateTimeField(auto_now=True)),
+                ('images', models.ManyToManyField(related_name='_expandedrichtext_images_+', to='wagtailimages.Image')),
+                ('pages', models.ManyToManyField(related_name='_expandedrichtext_pages_+', to='wagtailcore.Page')),
+            ],
+            options={
+                'verbose_name': 'Expanded Rich Text',
+                'verbose_name_plural': 'Expanded Rich Texts',
+            },
+        ),
+    ]
@@ -1,3 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Streams Models
+
+Front-end HTML of published rich text, see streams/richtext.py.
+"""
 from django.db import models
 
-# Create your models here.
+
+class ExpandedRichText(models.Model):
+    """Rich text source with its page links and image embeds expanded."""
+
+    # md5 of the source, so the same text on several pages is stored once.
+    source_hash = models.CharField(max_length=32, primary_key=True)
+    source = models.TextField()
+    html = models.TextField()
+    # What the expansion links to, to find the HTML to redo when they change.
+    pages = models.ManyToManyField('wagtailcore.Page', related_name='+')
+    images = models.ManyToManyField('wagtailimages.Image', related_name='+')
+    expanded_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Expanded Rich Text'
+        verbose_name_plural = 'Expanded Rich Texts'
+
+    def __str__(self):
+        return self.source_hash
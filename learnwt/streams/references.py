@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+StreamField Reference Resolution
+
+Wagtail turns a StreamField's raw JSON into block values lazily, one block at
+a time, and every PageChooserBlock or ImageChooserBlock in a struct or list
+block fetches its page or image with a query of its own. resolve_references()
+does that conversion up front for the whole stream instead: it collects every
+referenced page and image ID, loads them in one query per model and hands the
+instances to the blocks.
+
+    def get_context(self, request, *args, **kwargs):
+        context = super().get_context(request, *args, **kwargs)
+        resolve_references(self.content, request)
+        return context
+
+The loaded pages share one copy of the site root paths, so their ``.url``
+doesn't look those up again page by page.
+
+Rich text blocks get the HTML stored for them when the page was published
+(streams/richtext.py), also in one query.
+
+Blocks can also name the renditions their template shows the images inside
+them with; those are prefetched for the whole stream too:
+
+    class CardBlock(blocks.StructBlock):
+        image_renditions = ['fill-300x300']
+"""
+from wagtail.core import blocks
+from wagtail.core.models import Page, Site
+from wagtail.images import get_image_model
+from wagtail.images.blocks import ImageChooserBlock
+
+from renditions.prefetch import prefetch_renditions
+
+from .models import ExpandedRichText
+from .richtext import load_expansions, stored_rich_text
+
+
+def is_resolved(block):
+    """Whether values of ``block`` are loaded in bulk."""
+    return isinstance(block, (blocks.PageChooserBlock, ImageChooserBlock))
+
+
+def converts_itself(block):
+    """Whether ``block`` overrides to_python(), in which case we leave it be."""
+    for base in (blocks.StructBlock, blocks.ListBlock, blocks.StreamBlock):
+        if isinstance(block, base):
+            return type(block).to_python is not base.to_python
+    return True
+
+
+def collect(block, raw, ids, renditions, specs=()):
+    """
+    Add the IDs referenced by the raw value of ``block`` to ``ids``, and its
+    rich text sources under ExpandedRichText.
+
+    ``renditions`` maps image IDs to the specs the closest enclosing block
+    with ``image_renditions`` asks for.
+    """
+    if raw is None:
+        return
+    specs = getattr(block, 'image_renditions', specs)
+    if is_resolved(block):
+        ids.setdefault(block.target_model, set()).add(raw)
+        if isinstance(block, ImageChooserBlock):
+            renditions.setdefault(raw, set()).update(specs)
+    elif isinstance(block, blocks.RichTextBlock):
+        if raw:
+            ids.setdefault(ExpandedRichText, set()).add(raw)
+    elif isinstance(block, blocks.StructBlock):
+        for name, child_block in block.child_blocks.items():
+            if name in raw:
+                collect(child_block, raw[name], ids, renditions, specs)
+    elif isinstance(block, blocks.ListBlock):
+        for item in raw:
+            collect(block.child_block, item, ids, renditions, specs)
+    elif isinstance(block, blocks.StreamBlock):
+        for item in raw:
+            child_block = block.child_blocks.get(item['type'])
+            if child_block is not None:
+                collect(child_block, item['value'], ids, renditions, specs)
+
+
+def to_python(block, raw, loaded):
+    """Like ``block.to_python(raw)``, taking references from ``loaded``."""
+    if is_resolved(block):
+        return None if raw is None else loaded[block.target_model].get(raw)
+    if isinstance(block, blocks.RichTextBlock):
+        return stored_rich_text(raw, loaded[ExpandedRichText])
+    if converts_itself(block):
+        return block.to_python(raw)
+    if isinstance(block, blocks.StructBlock):
+        # What StructBlock.to_python() builds, Meta.value_class included.
+        return block.meta.value_class(block, [
+            (
+                name,
+                to_python(child_block, raw[name], loaded) if name in raw
+                else child_block.get_default()
+            )
+            for name, child_block in block.child_blocks.items()
+        ])
+    if isinstance(block, blocks.ListBlock):
+        return [to_python(block.child_block, item, loaded) for item in raw]
+    value = block.to_python(raw)
+    populate(value, loaded)
+    return value
+
+
+def populate(stream_value, loaded):
+    """
+    Turn a lazy StreamValue into a converted one in place.
+
+    Its raw ``{'type', 'value', 'id'}`` dicts are swapped for the
+    ``(type, value, id)`` tuples a StreamValue made with ``is_lazy=False``
+    holds, so it serves and saves them like any other converted value.
+    """
+    stream_block = stream_value.stream_block
+    stream_value.stream_data = [
+        (
+            item['type'],
+            to_python(stream_block.child_blocks[item['type']], item['value'], loaded),
+            item.get('id'),
+        )
+        for item in stream_value.stream_data
+    ]
+    stream_value.is_lazy = False
+
+
+def resolve_references(stream_value, request=None):
+    """Load the pages and images referenced anywhere in a StreamField value."""
+    resolve_all_references([stream_value], request)
+    return stream_value
+
+
+def resolve_all_references(stream_values, request=None):
+    """Like resolve_references() for many values, e.g. one per API result."""
+    stream_values = [
+        stream_value for stream_value in stream_values
+        if stream_value and stream_value.is_lazy
+    ]
+    if not stream_values:
+        return
+
+    ids = {}
+    renditions = {}
+    for stream_value in stream_values:
+        collect(stream_value.stream_block, stream_value.stream_data, ids, renditions)
+    sources = ids.pop(ExpandedRichText, ())
+    loaded = {model: model.objects.in_bulk(pks) for model, pks in ids.items()}
+    loaded[ExpandedRichText] = load_expansions(sources)
+
+    # What Page._get_site_root_paths() would otherwise fetch per instance.
+    root_paths = getattr(request, '_wagtail_cached_site_root_paths', None)
+    if root_paths is None:
+        root_paths = Site.get_site_root_paths()
+    for model, instances in loaded.items():
+        if issubclass(model, Page):
+            for page in instances.values():
+                page._wagtail_cached_site_root_paths = root_paths
+
+    # Images wanted in the same specs share a query, usually there's one.
+    images = loaded.get(get_image_model(), {})
+    by_specs = {}
+    for pk, specs in renditions.items():
+        if specs:
+            by_specs.setdefault(tuple(sorted(specs)), []).append(images.get(pk))
+    for specs, spec_images in by_specs.items():
+        prefetch_renditions(spec_images, *specs)
+
+    for stream_value in stream_values:
+        populate(stream_value, loaded)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Stored Rich Text
+
+Rich text is stored with ``<a linktype="page">`` links and ``<embed>`` images
+that are rewritten into real HTML on every render, at a query or two per link.
+Instead, the front-end HTML of each piece of rich text is worked out once,
+when the page using it is published, and kept in ExpandedRichText next to its
+source. Pages then load the stored HTML in bulk:
+
+    expansions = load_expansions(sources)
+    value = stored_rich_text(source, expansions)
+
+Text without stored HTML (previews, pages published before this existed)
+renders the usual way. streams/signals.py redoes stored HTML when pages it
+links to move, are renamed or deleted and when images it shows change;
+``manage.py expand_richtext`` rebuilds all of it.
+"""
+import hashlib
+from logging import getLogger
+
+from django.db.models import Q
+from wagtail.core import blocks
+from wagtail.core.fields import RichTextField, StreamField
+from wagtail.core.models import Page
+from wagtail.core.rich_text import RichText, expand_db_html
+from wagtail.images import get_image_model
+
+from .cache import rich_text_references
+from .models import ExpandedRichText
+
+
+logger = getLogger(__name__)
+
+
+def source_key(source):
+    return hashlib.md5(source.encode()).hexdigest()
+
+
+class StoredRichText(RichText):
+    """A RichText value rendering HTML expanded beforehand."""
+
+    def __init__(self, source, html):
+        super().__init__(source)
+        self.html = html
+
+    def __html__(self):
+        return '<div class="rich-text">' + self.html + '</div>'
+
+
+def stored_rich_text(source, expansions):
+    """Return a rich text value for ``source``, stored HTML if there is some."""
+    source = source or ''
+    expansion = expansions.get(source_key(source)) if source else None
+    if expansion is None:
+        return RichText(source)
+    return StoredRichText(source, expansion.html)
+
+
+def load_expansions(sources):
+    """Return the stored HTML of ``sources`` by source_key() in one query."""
+    keys = {source_key(source) for source in sources if source}
+    if not keys:
+        return {}
+    return ExpandedRichText.objects.defer('source').in_bulk(keys)
+
+
+def stream_sources(block, raw):
+    """Yield the rich text sources in the raw value of ``block``."""
+    if raw is None:
+        return
+    if isinstance(block, blocks.RichTextBlock):
+        yield raw
+    elif isinstance(block, blocks.StructBlock):
+        for name, child_block in block.child_blocks.items():
+            if name in raw:
+                yield from stream_sources(child_block, raw[name])
+    elif isinstance(block, blocks.ListBlock):
+        for item in raw:
+            yield from stream_sources(block.child_block, item)
+    elif isinstance(block, blocks.StreamBlock):
+        for item in raw:
+            child_block = block.child_blocks.get(item['type'])
+            if child_block is not None:
+                yield from stream_sources(child_block, item['value'])
+
+
+def page_sources(page):
+    """Yield the rich text sources of a (specific) page's fields."""
+    for field in page._meta.get_fields():
+        if isinstance(field, RichTextField):
+            yield getattr(page, field.attname)
+        elif isinstance(field, StreamField):
+            value = getattr(page, field.attname)
+            if value:
+                yield from stream_sources(field.stream_block, value.get_prep_value())
+
+
+def expand(expansion):
+    """(Re)build the HTML of an ExpandedRichText and what it links to."""
+    expansion.html = expand_db_html(expansion.source)
+    expansion.save()
+    page_ids, image_ids = set(), set()
+    for kind, pk in rich_text_references(expansion.source):
+        (page_ids if kind == 'page' else image_ids).add(pk)
+    # Links to deleted pages and images expand to empty tags, nothing to track.
+    expansion.pages.set(Page.objects.filter(pk__in=page_ids))
+    expansion.images.set(get_image_model().objects.filter(pk__in=image_ids))
+    return expansion
+
+
+def store_sources(sources):
+    """Expand and store the sources that aren't stored yet."""
+    sources = {source_key(source): source for source in sources if source}
+    stored = set(
+        ExpandedRichText.objects.filter(pk__in=sources).values_list('pk', flat=True)
+    )
+    for key, source in sources.items():
+        if key not in stored:
+            expand(ExpandedRichText(source_hash=key, source=source))
+    return len(sources) - len(stored)
+
+
+def store_page(page):
+    """Store the HTML of a page's rich text, called when it's published."""
+    return store_sources(page_sources(page))
+
+
+def linking_to(pages=None, images=None):
+    """Stored HTML that links to one of ``pages`` or shows one of ``images``."""
+    condition = Q(pk__in=[])
+    if pages is not None:
+        condition |= Q(pages__in=pages)
+    if images is not None:
+        condition |= Q(images__in=images)
+    return ExpandedRichText.objects.filter(condition).distinct()
+
+
+def refresh(expansions):
+    """Expand stored rich text again, returns how many there were."""
+    count = 0
+    for expansion in expansions:
+        expand(expansion)
+        count += 1
+    if count:
+        logger.info(f'Expanded {count} stored rich texts again')
+    return count
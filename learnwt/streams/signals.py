@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Stored Rich Text Signals
+
+Store the front-end HTML of a page's rich text when it's published, and redo
+the stored HTML that links to pages whose URL changed (moves, renamed slugs,
+deletions) or shows images that changed. See streams/richtext.py.
+"""
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from wagtail.core.models import Page, Site
+from wagtail.core.signals import page_published
+from wagtail.images import get_image_model
+
+from caching import pages
+from caching.tracking import stored_values, track
+
+from . import richtext
+from .models import ExpandedRichText
+
+
+def refresh_after_commit(expansions):
+    """Expand again once URL changes are committed, then purge cached pages."""
+    def refresh():
+        if richtext.refresh(expansions):
+            pages.purge_all()
+    # Page.save() and Page.move() update the URLs of descendants after saving.
+    transaction.on_commit(refresh)
+
+
+@receiver(page_published)
+def store_published(sender, instance, **kwargs):
+    richtext.store_page(instance)
+
+
+def snapshot_url_path(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        return
+    if update_fields is not None and 'url_path' not in update_fields:
+        return
+    stored = stored_values(instance, ['url_path'])
+    instance._stored_url_path = stored and stored['url_path']
+
+
+def url_path_changed(sender, instance, **kwargs):
+    old_url_path = getattr(instance, '_stored_url_path', None)
+    instance._stored_url_path = None
+    if old_url_path is None or old_url_path == instance.url_path:
+        return
+    # The page and everything below it have new URLs.
+    moved = Page.objects.filter(path__startswith=instance.path)
+    refresh_after_commit(richtext.linking_to(pages=moved))
+
+
+# Page signals are sent with the specific class.
+track(Page, ['url_path'])
+for model in apps.get_models():
+    if issubclass(model, Page):
+        pre_save.connect(snapshot_url_path, sender=model)
+        post_save.connect(url_path_changed, sender=model)
+
+
+@receiver(pre_delete)
+def linked_deleted(sender, instance, **kwargs):
+    # The links are gone with the instance, so find them now.
+    if isinstance(instance, Page):
+        linking = richtext.linking_to(pages=[instance])
+    elif isinstance(instance, get_image_model()):
+        linking = richtext.linking_to(images=[instance])
+    else:
+        return
+    pks = list(linking.values_list('pk', flat=True))
+    if pks:
+        refresh_after_commit(ExpandedRichText.objects.filter(pk__in=pks))
+
+
+@receiver(post_save, sender=get_image_model())
+def image_saved(sender, instance, created, **kwargs):
+    if not created:
+        refresh_after_commit(richtext.linking_to(images=[instance]))
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def site_changed(sender, instance, **kwargs):
+    # Page URLs depend on the sites, and on how many there are.
+    refresh_after_commit(ExpandedRichText.objects.all())
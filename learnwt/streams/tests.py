@@ -1,3 +1,206 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from wagtail.core.blocks import StreamValue, StructBlock
+
+from caching.pages import skip_response
+from flex.models import FlexPage
+from learnwt.testing import create_image, create_post, create_site, test_settings
+
+from .blocks import CardBlock, CTABlock, LinkStructValue
+from .references import resolve_references
+from .richtext import StoredRichText, load_expansions, stored_rich_text
+
+
+@test_settings
+class ResolveReferencesTests(TestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        post, other = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        card = {
+            'image': self.site.image.pk, 'title': 'Card', 'text': 'Text',
+            'button_page': post.pk, 'button_url': '',
+        }
+        self.page = self.site.home.add_child(instance=FlexPage(
+            title='Flex', slug='flex', content=json.dumps([
+                {'type': 'cards', 'value': {'title': 'Cards', 'cards': [card, card]}},
+                {'type': 'cta', 'value': {
+                    'title': 'Call', 'text': f'<p><a linktype="page" id="{other.pk}">Other</a></p>',
+                    'button_page': other.pk, 'button_url': '', 'button_text': 'Go',
+                }},
+                {'type': 'button_block', 'value': {
+                    'button_page': self.site.listing.pk, 'button_url': '', 'button_text': 'Blog',
+                }},
+            ]),
+        ))
+        self.page.save_revision().publish()
+
+    def load(self):
+        return FlexPage.objects.get(pk=self.page.pk).content
+
+    def prep_values(self, stream_value):
+        return [
+            (child.block_type, child.id, child.block.get_prep_value(child.value))
+            for child in stream_value
+        ]
+
+    def test_values_match_wagtails_own(self):
+        resolved = resolve_references(self.load())
+        self.assertFalse(resolved.is_lazy)
+        self.assertEqual(self.prep_values(resolved), self.prep_values(self.load()))
+        self.assertEqual(resolved.get_prep_value(), self.load().get_prep_value())
+
+    def test_references_are_loaded_in_bulk(self):
+        content = resolve_references(self.load())
+        with self.assertNumQueries(0):
+            cards, cta, button = [child.value for child in content]
+            self.assertEqual(
+                [card['image'].pk for card in cards['cards']],
+                [self.site.image.pk] * 2
+            )
+            self.assertEqual(cards['cards'][0]['button_page'].url, '/blog/post-0/')
+            self.assertEqual(cta['button_page'].url, '/blog/post-1/')
+            self.assertEqual(button.url(), '/blog/')
+
+    def test_card_renditions_are_prefetched(self):
+        self.site.image.get_rendition('fill-300x300')
+        cards = list(resolve_references(self.load()))[0]
+        with self.assertNumQueries(0):
+            html = cards.render()
+        self.assertEqual(html.count('fill-300x300'), 2)
+
+    def test_query_count_doesnt_grow_with_the_stream(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                resolve_references(self.load())
+            return len(queries)
+
+        self.site.image.get_rendition('fill-300x300')
+        count_queries()  # Caches the site root paths.
+        queries = count_queries()
+        page = FlexPage.objects.get(pk=self.page.pk)
+        page.content = json.dumps(page.content.get_prep_value() * 3)
+        page.save()
+        self.assertEqual(count_queries(), queries)
+
+    def test_value_class_is_kept(self):
+        button = list(resolve_references(self.load()))[2].value
+        self.assertIsInstance(button, LinkStructValue)
+
+    def test_already_converted_values_are_left_alone(self):
+        content = resolve_references(self.load())
+        with self.assertNumQueries(0):
+            resolve_references(content)
+        converted = StreamValue(content.stream_block, [], is_lazy=False)
+        self.assertIs(resolve_references(converted), converted)
+
+
+@test_settings
+class BlockRenderCacheTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.posts = [create_post(self.site.listing, i, self.site.image) for i in range(2)]
+        self.block = CTABlock()
+
+    def value(self, page, text='<p>Text</p>'):
+        return self.block.to_python({
+            'title': 'Call', 'text': text, 'button_page': page.pk,
+            'button_url': '', 'button_text': 'Go',
+        })
+
+    def test_rendered_blocks_are_cached(self):
+        value = self.value(self.posts[0])
+        html = self.block.render(value)
+        self.assertIn('Call', html)
+        self.assertEqual(cache.get(self.block.render_cache_key(value)), html)
+        cache.set(self.block.render_cache_key(value), 'cached')
+        self.assertEqual(self.block.render(value), 'cached')
+
+    def test_keys_change_with_the_value(self):
+        post = self.posts[0]
+        self.assertEqual(
+            self.block.render_cache_key(self.value(post)),
+            self.block.render_cache_key(self.value(post))
+        )
+        self.assertNotEqual(
+            self.block.render_cache_key(self.value(post)),
+            self.block.render_cache_key(self.value(post, '<p>Other</p>'))
+        )
+
+    def test_keys_change_when_linked_pages_are_published(self):
+        post, other = self.posts
+        text = f'<p><a linktype="page" id="{other.pk}">Other</a></p>'
+        chooser_key = self.block.render_cache_key(self.value(post))
+        rich_text_key = self.block.render_cache_key(self.value(self.site.listing, text))
+        post.save_revision().publish()
+        self.assertNotEqual(self.block.render_cache_key(self.value(post)), chooser_key)
+        other.save_revision().publish()
+        self.assertNotEqual(
+            self.block.render_cache_key(self.value(self.site.listing, text)), rich_text_key
+        )
+
+    def test_keys_change_with_the_image_focal_point(self):
+        block = CardBlock()
+        image = create_image()
+        value = block.to_python({'title': 'Cards', 'cards': [{
+            'image': image.pk, 'title': 'Card', 'text': 'Text',
+            'button_page': None, 'button_url': '',
+        }]})
+        key = block.render_cache_key(value)
+        image.focal_point_x = 10
+        image.save()
+        value = block.to_python(block.get_prep_value(value))
+        self.assertNotEqual(block.render_cache_key(value), key)
+
+    def test_blocks_that_skip_the_page_cache_arent_cached(self):
+        value = self.value(self.posts[0])
+        request = RequestFactory().get('/')
+        with mock.patch.object(
+            StructBlock, 'render', side_effect=lambda *args, **kwargs: skip_response(request)
+        ):
+            self.block.render(value, {'request': request})
+        self.assertIsNone(cache.get(self.block.render_cache_key(value)))
+
+
+@test_settings
+class StoredRichTextTests(TransactionTestCase):
+
+    def setUp(self):
+        self.site = create_site()
+        self.post, self.other = [
+            create_post(self.site.listing, i, self.site.image) for i in range(2)
+        ]
+        self.source = f'<p><a linktype="page" id="{self.other.pk}">Other</a></p>'
+        self.post.blog_summary = self.source
+        self.post.save_revision().publish()
+
+    def stored_html(self):
+        expansions = load_expansions([self.source])
+        return stored_rich_text(self.source, expansions).html
+
+    def test_rich_text_is_stored_when_published(self):
+        self.assertEqual(self.stored_html(), '<p><a href="/blog/post-1/">Other</a></p>')
+        sources = [self.post.blog_summary, '<p>Body of post 0</p>', '<p>Never published</p>']
+        expansions = load_expansions(sources)
+        self.assertEqual(len(expansions), 2)
+        self.assertNotIsInstance(stored_rich_text(sources[2], expansions), StoredRichText)
+
+    def test_moved_pages_are_linked_again(self):
+        self.other.move(self.site.home, pos='last-child')
+        self.assertEqual(self.stored_html(), '<p><a href="/post-1/">Other</a></p>')
+
+    def test_renamed_slugs_are_linked_again(self):
+        self.other.slug = 'renamed'
+        self.other.save_revision().publish()
+        self.assertEqual(self.stored_html(), '<p><a href="/blog/renamed/">Other</a></p>')
+
+    def test_deleted_pages_are_unlinked(self):
+        self.other.delete()
+        self.assertEqual(self.stored_html(), '<p><a>Other</a></p>')